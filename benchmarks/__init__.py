@@ -0,0 +1,12 @@
+"""Benchmarks for the everypolitician package
+
+These aren't part of the installed package; run them from a checkout,
+e.g. with:
+
+    python -m benchmarks.object_graph
+    python -m benchmarks.api --output results.json
+    python -m benchmarks.import_time
+
+benchmarks.dataset generates synthetic data at any scale, and
+benchmarks.server serves it locally.
+"""
@@ -0,0 +1,166 @@
+"""Time the main EveryPolitician API calls against a synthetic dataset
+
+This generates a dataset (see benchmarks.dataset) in a temporary
+directory, serves it over HTTP from this machine, and measures each of
+the calls below, both the first time it's made on a new EveryPolitician
+object ("cold", which includes any downloading and parsing it causes)
+and once everything it needs is loaded ("warm").  The peak memory
+allocated by Python during the cold call is measured with tracemalloc.
+
+The results are printed, and written as JSON to --output if it's given,
+so that they can be compared between releases:
+
+    python -m benchmarks.api --countries 200 --output before.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+from collections import OrderedDict
+import gc
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from everypolitician import EveryPolitician
+
+from .dataset import add_scale_arguments, generate
+from .server import serve
+
+
+def make_ep(base_url):
+    return EveryPolitician(
+        countries_json_url=base_url + '/countries.json',
+        data_base_url=base_url)
+
+
+def loaded_ep(base_url):
+    ep = make_ep(base_url)
+    ep.countries_json_data()
+    return ep
+
+
+def last_country_slug(ep):
+    return ep.countries_json_data()[-1]['slug']
+
+
+def benchmarks(n_legislatures):
+    """Return (name, setup, call) for each benchmark
+
+    setup(base_url) returns the argument for call, which makes the API
+    call being measured."""
+    legislature = 'House-{0}'.format(n_legislatures - 1)
+
+    def country_legislature(ep):
+        return ep.country_legislature(last_country_slug(ep), legislature)
+
+    return [
+        ('countries_json_data', make_ep,
+         lambda ep: ep.countries_json_data()),
+        ('country', loaded_ep,
+         lambda ep: ep.country(last_country_slug(ep))),
+        ('country_legislature', loaded_ep, country_legislature),
+        ('house_most_recent',
+         lambda base_url: country_legislature(loaded_ep(base_url))[0],
+         lambda country: country.house_most_recent('lower house')),
+        ('latest_legislative_period',
+         lambda base_url: country_legislature(loaded_ep(base_url))[1],
+         lambda legislature: legislature.latest_legislative_period()),
+        ('csv',
+         lambda base_url: country_legislature(loaded_ep(base_url))[1]
+         .latest_legislative_period(),
+         lambda period: period.csv()),
+    ]
+
+
+def measure(setup, call, base_url, repeats):
+    cold = []
+    for _ in range(repeats):
+        arg = setup(base_url)
+        gc.collect()
+        start = time.perf_counter()
+        call(arg)
+        cold.append(time.perf_counter() - start)
+    warm = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call(arg)
+        warm.append(time.perf_counter() - start)
+    arg = setup(base_url)
+    gc.collect()
+    tracemalloc.start()
+    call(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return OrderedDict([
+        ('cold_seconds', statistics.median(cold)),
+        ('cold_min_seconds', min(cold)),
+        ('warm_seconds', statistics.median(warm)),
+        ('peak_bytes', peak),
+    ])
+
+
+def run(n_countries, n_legislatures, n_periods, n_members, repeats):
+    directory = tempfile.mkdtemp()
+    try:
+        with serve(directory) as base_url:
+            dataset_bytes = generate(
+                directory, base_url, n_countries, n_legislatures, n_periods,
+                n_members)
+            results = OrderedDict()
+            for name, setup, call in benchmarks(n_legislatures):
+                results[name] = measure(setup, call, base_url, repeats)
+    finally:
+        shutil.rmtree(directory)
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('scale', OrderedDict([
+            ('countries', n_countries),
+            ('legislatures', n_legislatures),
+            ('periods', n_periods),
+            ('members', n_members),
+            ('dataset_bytes', dataset_bytes),
+        ])),
+        ('repeats', repeats),
+        ('results', results),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_scale_arguments(parser)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='a file to write the results to')
+    parser.add_argument(
+        '--baseline',
+        help='the results of an earlier run, to show the change from')
+    args = parser.parse_args()
+    report = run(
+        args.countries, args.legislatures, args.periods, args.members,
+        args.repeats)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    for name, result in report['results'].items():
+        line = '{0:<28} cold {1:9.3f} ms  warm {2:9.4f} ms  ' \
+            'peak {3:9.1f} KiB'.format(
+                name, result['cold_seconds'] * 1000,
+                result['warm_seconds'] * 1000, result['peak_bytes'] / 1024.0)
+        if name in baseline:
+            line += '  (cold x{0:.2f}, peak x{1:.2f})'.format(
+                result['cold_seconds'] / baseline[name]['cold_seconds'],
+                result['peak_bytes'] / float(baseline[name]['peak_bytes']))
+        print(line)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Generate a synthetic EveryPolitician dataset at any scale
+
+The files are laid out as they'd be served from everypolitician-data:
+countries.json at the top, and the Popolo JSON and legislative period
+CSV files of each legislature under a directory named after its sha,
+so that a plain static file server can stand in for the real one.
+
+    python -m benchmarks.dataset /tmp/ep-data --countries 200
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+from os.path import dirname, join
+
+
+CSV_HEADER = [
+    'id', 'name', 'sort_name', 'email', 'twitter', 'facebook', 'group',
+    'group_id', 'area_id', 'area', 'chamber', 'term', 'start_date',
+    'end_date', 'image', 'gender',
+]
+
+GROUPS = ['Red', 'Blue', 'Green', 'Yellow', 'Purple', 'Independent']
+
+
+def legislature_types(n_legislatures):
+    if n_legislatures == 1:
+        return ['unicameral legislature']
+    return (['lower house', 'upper house'] +
+            ['unicameral legislature'] * (n_legislatures - 2))
+
+
+def person_id(country, legislature, member):
+    return 'person/{0}/{1}/{2}'.format(country, legislature, member)
+
+
+def make_popolo(country, legislature, n_members):
+    persons = []
+    for member in range(n_members):
+        persons.append({
+            'id': person_id(country, legislature, member),
+            'name': 'Member {0} of {1}'.format(member, legislature),
+            # Members with the same number in each legislature of a
+            # country are the same person, as far as Wikidata's concerned:
+            'identifiers': [{
+                'scheme': 'wikidata',
+                'identifier': 'Q{0}'.format(
+                    10 ** 6 * (1 + int(country.split('-')[1])) + member),
+            }],
+        })
+    return {'persons': persons}
+
+
+def make_csv(country, legislature, legislature_name, term, n_members):
+    f = io.StringIO()
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(CSV_HEADER)
+    for member in range(n_members):
+        group = GROUPS[member % len(GROUPS)]
+        area = 'Area {0}'.format(member % 50)
+        name = 'Member {0} of {1}'.format(member, legislature)
+        writer.writerow([
+            person_id(country, legislature, member), name,
+            name, 'member{0}@example.org'.format(member), '', '',
+            group, group.lower(), 'area/{0}'.format(member % 50), area,
+            legislature_name, term, '', '', '',
+            'female' if member % 2 else 'male',
+        ])
+    return f.getvalue().encode('utf-8')
+
+
+def generate(directory, base_url, n_countries=100, n_legislatures=2,
+             n_periods=4, n_members=100):
+    """Write the dataset to directory, to be served from base_url
+
+    Returns the number of bytes written."""
+    countries = []
+    written = [0]
+
+    def write(path, data):
+        filename = join(directory, path)
+        if not os.path.isdir(dirname(filename)):
+            os.makedirs(dirname(filename))
+        with open(filename, 'wb') as f:
+            f.write(data)
+        written[0] += len(data)
+
+    types = legislature_types(n_legislatures)
+    for c in range(n_countries):
+        country = 'Country-{0}'.format(c)
+        legislatures = []
+        for l in range(n_legislatures):
+            legislature = 'House-{0}'.format(l)
+            legislature_name = 'House {0} of {1}'.format(l, country)
+            sha = hashlib.sha1(
+                '{0}/{1}'.format(country, legislature).encode('utf-8')
+            ).hexdigest()
+            directory_path = 'data/{0}/{1}'.format(country, legislature)
+            popolo_path = directory_path + '/ep-popolo-v1.0.json'
+            write('{0}/{1}'.format(sha, popolo_path), json.dumps(
+                make_popolo(country, legislature, n_members)).encode('utf-8'))
+            periods = []
+            for p in range(n_periods):
+                year = 2016 - 4 * p
+                term = str(year)
+                csv_path = '{0}/term-{1}.csv'.format(directory_path, term)
+                write('{0}/{1}'.format(sha, csv_path), make_csv(
+                    country, legislature, legislature_name, term, n_members))
+                period = {
+                    'csv': csv_path,
+                    'id': 'term/{0}'.format(term),
+                    'name': '{0}-{1}'.format(year, year + 4),
+                    'slug': term,
+                    'start_date': '{0}-05-01'.format(year),
+                }
+                if p > 0:
+                    period['end_date'] = '{0}-04-30'.format(year + 4)
+                periods.append(period)
+            legislatures.append({
+                'lastmod': '1477635781',
+                'legislative_periods': periods,
+                'name': legislature_name,
+                'person_count': n_members,
+                'popolo': popolo_path,
+                'popolo_url': '{0}/{1}/{2}'.format(base_url, sha, popolo_path),
+                'sha': sha,
+                'slug': legislature,
+                'sources_directory': directory_path + '/sources',
+                'statement_count': n_members * 20,
+                'type': types[l],
+            })
+        countries.append({
+            'code': 'C{0}'.format(c),
+            'country': country,
+            'legislatures': legislatures,
+            'name': country,
+            'slug': country,
+        })
+    write('countries.json', json.dumps(countries).encode('utf-8'))
+    return written[0]
+
+
+def add_scale_arguments(parser):
+    parser.add_argument('--countries', type=int, default=100)
+    parser.add_argument('--legislatures', type=int, default=2)
+    parser.add_argument('--periods', type=int, default=4)
+    parser.add_argument('--members', type=int, default=100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument(
+        '--base-url', default='http://127.0.0.1:8000',
+        help='the URL the directory will be served from')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    size = generate(
+        args.directory, args.base_url, args.countries, args.legislatures,
+        args.periods, args.members)
+    print('Wrote {0:.1f} MiB to {1}'.format(
+        size / 1024.0 / 1024.0, args.directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Measure how long "import everypolitician" takes
+
+Each run imports the package in a new Python process with -X importtime,
+after one run to make sure the bytecode is compiled, and the median of
+the cumulative times is reported, along with which of the modules that
+are meant to be deferred were imported anyway.  Give --max-ms to exit
+with an error if the median is slower than that, e.g. in CI:
+
+    python -m benchmarks.import_time --max-ms 50 --output import.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+from collections import OrderedDict
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+# Modules that "import everypolitician" shouldn't import:
+DEFERRED_MODULES = (
+    'requests', 'popolo_data', 'six', 'csv', 'concurrent.futures.process',
+    'hashlib')
+
+SCRIPT = '''
+import json
+import sys
+import everypolitician
+print(json.dumps([m for m in {0!r} if m in sys.modules]))
+'''.format(DEFERRED_MODULES)
+
+
+def import_once(env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    microseconds = None
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == 'everypolitician':
+            microseconds = int(parts[1])
+    return microseconds / 1e6, json.loads(result.stdout)
+
+
+def run(repeats):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPYCACHEPREFIX'] = tempfile.mkdtemp()
+    import_once(env)
+    times = []
+    for _ in range(repeats):
+        seconds, imported = import_once(env)
+        times.append(seconds)
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('repeats', repeats),
+        ('median_seconds', statistics.median(times)),
+        ('min_seconds', min(times)),
+        ('deferred_modules_imported', imported),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--max-ms', type=float,
+                        help='fail if the median is slower than this')
+    parser.add_argument('--output', help='a file to write the results to')
+    args = parser.parse_args()
+    report = run(args.repeats)
+    print('import everypolitician: median {0:.1f} ms, best {1:.1f} ms'.format(
+        report['median_seconds'] * 1000, report['min_seconds'] * 1000))
+    if report['deferred_modules_imported']:
+        print('Imported modules that should be deferred: {0}'.format(
+            ', '.join(report['deferred_modules_imported'])))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['deferred_modules_imported'] or (
+            args.max_ms is not None and
+            report['median_seconds'] * 1000 > args.max_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Time and measure building the full Country/Legislature/period graph
+
+This loads a countries.json made by repeating the example one in
+test-data until it has --countries countries, then creates every
+Country, Legislature and LegislativePeriod object and reads the
+attributes that a typical caller would, reporting the time taken and
+the memory allocated for the objects (not including the parsed JSON).
+
+The same graph is also built from reference classes that keep their
+attributes in a __dict__, as these classes did before they had
+__slots__, so that the difference is shown side by side.  The results
+can be written as JSON to --output, and compared with an earlier run
+given as --baseline:
+
+    python -m benchmarks.object_graph --output before.json
+    python -m benchmarks.object_graph --baseline before.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+from collections import OrderedDict
+import copy
+from datetime import datetime
+import gc
+import json
+from os.path import dirname, join
+import time
+import tracemalloc
+
+from everypolitician import EveryPolitician
+
+
+EXAMPLE_COUNTRIES_JSON = join(
+    dirname(dirname(__file__)), 'test-data', 'example-countries.json')
+
+
+def make_countries_json_data(n_countries):
+    with open(EXAMPLE_COUNTRIES_JSON, 'rb') as f:
+        example = json.loads(f.read().decode('utf-8'))
+    data = []
+    for i in range(n_countries):
+        country = copy.deepcopy(example[i % len(example)])
+        country['slug'] = '{0}-{1}'.format(country['slug'], i)
+        data.append(country)
+    return data
+
+
+class DictCountry(object):
+    """A Country as it was before it had __slots__"""
+
+    def __init__(self, country_data, ep):
+        for k in ('name', 'code', 'slug'):
+            setattr(self, k, country_data[k])
+        self.country_data = country_data
+        self.ep = ep
+        self._legislatures = None
+        self._legislatures_by_slug = None
+
+    def legislatures(self):
+        if self._legislatures is None:
+            self._legislatures = [
+                DictLegislature(legislature_data, self)
+                for legislature_data in self.country_data['legislatures']
+            ]
+            self._legislatures_by_slug = {}
+            for l in self._legislatures:
+                self._legislatures_by_slug.setdefault(l.slug, l)
+        return list(self._legislatures)
+
+
+class DictLegislature(object):
+    """A Legislature as it was before it had __slots__"""
+
+    def __init__(self, legislature_data, country):
+        for k in ('name', 'slug', 'person_count', 'sha', 'statement_count',
+                  'popolo_url', 'type'):
+            setattr(self, k, legislature_data[k])
+        self.lastmod = datetime.utcfromtimestamp(
+            float(legislature_data['lastmod']))
+        self.legislature_data = legislature_data
+        self.country = country
+        self.cached_popolo = None
+        self._legislative_periods = None
+
+    def legislative_periods(self):
+        if self._legislative_periods is None:
+            self._legislative_periods = [
+                DictLegislativePeriod(lp_data, self, self.country)
+                for lp_data in self.legislature_data['legislative_periods']
+            ]
+        return list(self._legislative_periods)
+
+
+class DictLegislativePeriod(object):
+    """A LegislativePeriod as it was before it had __slots__"""
+
+    def __init__(self, legislative_period_data, legislature, country):
+        for k in ('id', 'name', 'slug'):
+            setattr(self, k, legislative_period_data[k])
+        self.legislature = legislature
+        self.country = country
+        self.legislative_period_data = legislative_period_data
+        self.cached_csv = None
+        self._csv_fieldnames = None
+
+
+def countries(countries_json_data):
+    ep = EveryPolitician()
+    ep._countries_json_data = countries_json_data
+    return ep.countries()
+
+
+def reference_countries(countries_json_data):
+    return [DictCountry(country_data, None)
+            for country_data in countries_json_data]
+
+
+def build_graph(countries_json_data, make_countries=countries):
+    graph = make_countries(countries_json_data)
+    for country in graph:
+        country.name, country.code, country.slug
+        for legislature in country.legislatures():
+            legislature.name, legislature.slug, legislature.sha
+            for period in legislature.legislative_periods():
+                period.id, period.name, period.slug
+    return graph
+
+
+def measure(countries_json_data, make_countries, repeats):
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        build_graph(countries_json_data, make_countries)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    graph = build_graph(countries_json_data, make_countries)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(
+        stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del graph
+    return OrderedDict([
+        ('best_seconds', min(times)),
+        ('object_bytes', allocated),
+    ])
+
+
+def run(n_countries, repeats):
+    countries_json_data = make_countries_json_data(n_countries)
+    return OrderedDict([
+        ('countries', n_countries),
+        ('results', OrderedDict([
+            ('slots', measure(countries_json_data, countries, repeats)),
+            ('reference', measure(
+                countries_json_data, reference_countries, repeats)),
+        ])),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--countries', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='a file to write the results to')
+    parser.add_argument(
+        '--baseline',
+        help='the results of an earlier run, to show the change from')
+    args = parser.parse_args()
+    report = run(args.countries, args.repeats)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    results = report['results']
+    print('Built the object graph for {0} countries'.format(args.countries))
+    for name, result in results.items():
+        line = '  {0:<10} best {1:7.1f} ms  objects {2:9.1f} KiB'.format(
+            name, result['best_seconds'] * 1000,
+            result['object_bytes'] / 1024.0)
+        if name in baseline:
+            line += '  (time x{0:.2f}, memory x{1:.2f} of baseline)'.format(
+                result['best_seconds'] / baseline[name]['best_seconds'],
+                result['object_bytes'] /
+                float(baseline[name]['object_bytes']))
+        print(line)
+    slots, reference = results['slots'], results['reference']
+    print('  __slots__ vs __dict__: time x{0:.2f}, memory x{1:.2f}'.format(
+        slots['best_seconds'] / reference['best_seconds'],
+        slots['object_bytes'] / float(reference['object_bytes'])))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""A local static file server to stand in for the EveryPolitician CDN"""
+
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(directory):
+    """Serve the files in directory on a free local port
+
+    This yields the base URL of the server, which is shut down on
+    leaving the with block."""
+    server = ThreadingHTTPServer(
+        ('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
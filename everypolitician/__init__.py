@@ -1 +1,7 @@
+from .deferred import defer_attributes
 from .lib import *
+from .lib import __all__ as _lib_all
+
+__all__ = _lib_all + ['Popolo']
+
+defer_attributes(__name__, {'Popolo': 'everypolitician.lib:Popolo'})
@@ -0,0 +1,422 @@
+"""An asyncio version of the EveryPolitician API
+
+This needs Python 3.5 or later and aiohttp, which you can install with:
+
+    pip install everypolitician[async]
+
+The classes here mirror EveryPolitician, Country, Legislature and
+LegislativePeriod, except that the methods that might need to download
+something are coroutines:
+
+    async with AsyncEveryPolitician() as ep:
+        country, legislature = await ep.country_legislature(
+            'Australia', 'Senate')
+        popolo = await legislature.popolo()
+        rows = await legislature.latest_legislative_period().csv()
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import marshal
+
+import aiohttp
+from popolo_data.importer import Popolo
+
+from .lib import (
+    DEFAULT_PREFETCH_WORKERS, Country, EveryPolitician, Legislature,
+    LegislativePeriod, PrefetchResult, freeze_objects, parse_popolo_json,
+    transform_popolo_json)
+from .instrumentation import NO_TIMER
+from .lazy import LazyCountriesData
+from .people import PeopleIndex, people_shard
+from .rows import iter_lines, iter_records, select_records
+from .tables import MembershipsTable
+from .turnover import consecutive_diffs, diff_members, period_members
+
+
+DEFAULT_CONCURRENCY = 10
+
+
+class AsyncEveryPolitician(EveryPolitician):
+    """Like EveryPolitician, but downloads data with aiohttp
+
+    At most concurrency requests are made at once.  The keyword
+    arguments are the same as for EveryPolitician, except that session
+    should be an aiohttp.ClientSession, if given.  A session created by
+    this object is closed by close(), or on leaving an "async with"
+    block."""
+
+    def __init__(self, *args, **kwargs):
+        self.concurrency = kwargs.pop('concurrency', DEFAULT_CONCURRENCY)
+        super(AsyncEveryPolitician, self).__init__(*args, **kwargs)
+        self._semaphore = None
+        self._popolo_loads = {}
+
+    @property
+    def session(self):
+        """Return the aiohttp ClientSession used for all downloads"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        """Close the session, if it was created by this object, and the
+        snapshot file this was created from, if any"""
+        await self._close_session()
+        self._close_snapshot()
+
+    async def _close_session(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get(self, url, headers=None):
+        """Return the status, headers and body of a GET request for url"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            async with self.session.get(url, headers=headers) as r:
+                return r.status, r.headers, await r.read()
+
+    async def _fetch(self, url, cache_key=None, path=None, timer=NO_TIMER):
+        if self.data_repo_path is not None and path is not None:
+            return EveryPolitician._fetch(self, url, path=path, timer=timer)
+        if self._snapshot is not None and cache_key is not None:
+            data = self._snapshot.get(cache_key)
+            if data is not None:
+                timer.source = 'snapshot'
+                return data
+        if self.cache is not None and cache_key is not None:
+            data = self.cache.get(cache_key)
+            if data is not None:
+                timer.source = 'cache'
+                return data
+        status, headers, data = await self._get(url)
+        _raise_for_status(url, status)
+        if self.cache is not None and cache_key is not None:
+            self.cache.put(cache_key, data)
+        return data
+
+    async def _fetch_revalidated(self, url, timer=NO_TIMER):
+        if self.cache is None:
+            return await self._fetch(url, timer=timer)
+        cache_key = self._url_cache_key(url)
+        status, headers, data = await self._get(
+            url, headers=self._revalidation_headers(cache_key))
+        if status == 304:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                timer.source = 'revalidated'
+                return cached
+            status, headers, data = await self._get(url)
+        _raise_for_status(url, status)
+        self._store_revalidated(cache_key, url, data, headers)
+        return data
+
+    async def countries_json_data(self):
+        """Return countries JSON data parsed into Python data structures"""
+        if self._countries_json_data is not None:
+            return self._countries_json_data
+        if self.countries_json_filename is not None:
+            return EveryPolitician.countries_json_data(self)
+        with self._countries_json_timer() as timer:
+            data = timer.downloaded(
+                await self._fetch_revalidated(self.countries_json_url, timer))
+            if self._countries_json_data is None:
+                self._countries_json_data = self._parse_countries_json(data)
+        return self._countries_json_data
+
+    async def refresh(self):
+        """Load countries.json again, keeping whatever hasn't changed
+
+        See EveryPolitician.refresh."""
+        if self.countries_json_filename is not None:
+            return EveryPolitician.refresh(self)
+        with self._countries_json_timer() as timer:
+            data = timer.downloaded(
+                await self._fetch_revalidated(self.countries_json_url, timer))
+            data = self._parse_countries_json(data)
+        return self._apply_refresh(data)
+
+    def _loaded_countries_json_data(self):
+        if self._countries_json_data is None:
+            raise RuntimeError(
+                'The countries JSON data must be loaded with '
+                '"await countries_json_data()" first')
+        return self._countries_json_data
+
+    def _make_country(self, country_data):
+        return AsyncCountry(country_data, self)
+
+    async def countries(self):
+        """Return a list of all known countries"""
+        await self.countries_json_data()
+        return EveryPolitician.countries(self)
+
+    async def country(self, country_slug):
+        """Return an AsyncCountry object from a country slug"""
+        await self.countries_json_data()
+        return EveryPolitician.country(self, country_slug)
+
+    async def country_legislature(self, country_slug, legislature_slug):
+        """Return a tuple of Country and Legislature objects from their slugs"""
+        country = await self.country(country_slug)
+        return country, country.legislature(legislature_slug)
+
+    async def _countries_for(self, country_slugs):
+        await self.countries_json_data()
+        if country_slugs is None:
+            return EveryPolitician.countries(self)
+        countries = []
+        for slug in country_slugs:
+            countries.append(EveryPolitician.country(self, slug))
+        return countries
+
+    async def periods_overlapping(self, start, end):
+        """Return the legislative periods that overlap start to end
+
+        This is the same as EveryPolitician.periods_overlapping."""
+        await self.countries_json_data()
+        return EveryPolitician.periods_overlapping(self, start, end)
+
+    async def prefetch(self, country_slugs=None, kinds=('popolo', 'csv'),
+                       max_workers=DEFAULT_PREFETCH_WORKERS, progress=None):
+        """Concurrently load data for many legislatures
+
+        This is the same as EveryPolitician.prefetch, except that the
+        number of concurrent downloads is limited by the concurrency of
+        this object, so max_workers is ignored."""
+        countries = await self._countries_for(country_slugs)
+        result = PrefetchResult([], [])
+
+        async def load(obj, kind):
+            try:
+                await getattr(obj, kind)()
+            except Exception as e:
+                result.errors.append((obj, kind, e))
+                error = e
+            else:
+                result.loaded.append((obj, kind))
+                error = None
+            if progress is not None:
+                progress(obj, kind, error)
+
+        loads = []
+        for country in countries:
+            for legislature in country.legislatures():
+                if 'popolo' in kinds:
+                    loads.append(load(legislature, 'popolo'))
+                if 'csv' in kinds:
+                    loads.extend(
+                        load(lp, 'csv')
+                        for lp in legislature.legislative_periods())
+        await asyncio.gather(*loads)
+        return result
+
+    async def preload(self, country_slugs=None, kinds=(),
+                      max_workers=DEFAULT_PREFETCH_WORKERS, freeze=False):
+        """Load and index countries.json once, e.g. before forking workers
+
+        This is the same as EveryPolitician.preload."""
+        data = await self.countries_json_data()
+        if country_slugs is not None or \
+                not isinstance(data, LazyCountriesData):
+            self._preload_countries(
+                await self._countries_for(country_slugs),
+                country_slugs is None)
+        result = PrefetchResult([], [])
+        if kinds:
+            result = await self.prefetch(country_slugs, kinds=kinds)
+        await self._close_session()
+        self._semaphore = None
+        if freeze:
+            freeze_objects()
+        return result
+
+    async def people_index(self, country_slugs=None):
+        """Return a PeopleIndex of the members of every legislature
+
+        This is the same as EveryPolitician.people_index."""
+        countries = await self._countries_for(country_slugs)
+        index = PeopleIndex()
+        for country in countries:
+            for legislature in country.legislatures():
+                index.add(legislature, await legislature._load_people_shard())
+        return index
+
+    async def memberships_table(self, country_slugs=None, periods='all',
+                                columns=None, where=None):
+        """Return a MembershipsTable of the CSV rows of many periods
+
+        This is the same as EveryPolitician.memberships_table, except
+        that the CSV files are downloaded concurrently."""
+        countries = await self._countries_for(country_slugs)
+        legislative_periods = self._periods_for(countries, periods)
+        table = MembershipsTable()
+
+        async def fetch(lp):
+            with lp._csv_timer() as timer:
+                return timer.downloaded(await lp._csv_bytes(timer))
+
+        csv_data = await asyncio.gather(*map(fetch, legislative_periods))
+        for lp, data in zip(legislative_periods, csv_data):
+            records = iter_records(iter_lines([data]))
+            table.add(lp, select_records(records, columns, where))
+        return table
+
+    async def load_popolo_many(self, legislatures, processes=None,
+                               transform=None,
+                               max_workers=DEFAULT_PREFETCH_WORKERS):
+        """Load the Popolo data of many legislatures on a pool of processes
+
+        This is the same as EveryPolitician.load_popolo_many, except
+        that max_workers is ignored, as for prefetch."""
+        loop = asyncio.get_event_loop()
+        legislatures = list(legislatures)
+        with ProcessPoolExecutor(max_workers=processes) as parsers:
+
+            async def load(legislature):
+                if transform is None:
+                    popolo = legislature.cached_popolo
+                    if popolo is not None:
+                        return popolo
+                with legislature._popolo_timer() as timer:
+                    data = timer.downloaded(
+                        await legislature._popolo_bytes(timer))
+                if transform is not None:
+                    return await loop.run_in_executor(
+                        parsers, transform_popolo_json, transform, data)
+                popolo = Popolo(marshal.loads(await loop.run_in_executor(
+                    parsers, parse_popolo_json, data)))
+                self.popolo_cache.put(
+                    legislature._popolo_cache_key(), popolo, len(data))
+                return popolo
+
+            return list(await asyncio.gather(*map(load, legislatures)))
+
+
+class AsyncCountry(Country):
+
+    __slots__ = ()
+
+    def _make_legislature(self, legislature_data):
+        return AsyncLegislature(legislature_data, self)
+
+
+class AsyncLegislature(Legislature):
+
+    __slots__ = ()
+
+    async def turnover(self):
+        """Return a PeriodDiff for each pair of consecutive periods
+
+        This is the same as Legislature.turnover, except that the CSV
+        files are downloaded concurrently."""
+        periods = self._periods_by_start_date()
+        members = await asyncio.gather(*(lp._members() for lp in periods))
+        return consecutive_diffs(periods, members)
+
+    async def popolo(self):
+        ep = self.country.ep
+        key = self._popolo_cache_key()
+        popolo = ep.popolo_cache.get(key)
+        if popolo is not None:
+            return popolo
+        # Make sure that concurrent calls only load the data once:
+        load = ep._popolo_loads.get(key)
+        if load is None:
+            load = ep._popolo_loads[key] = asyncio.ensure_future(
+                self._load_popolo())
+            load.add_done_callback(lambda f: ep._popolo_loads.pop(key, None))
+        return await asyncio.shield(load)
+
+    async def _load_popolo(self):
+        with self._popolo_timer() as timer:
+            data = timer.downloaded(await self._popolo_bytes(timer))
+            popolo = self._popolo_from_bytes(data)
+        self.country.ep.popolo_cache.put(
+            self._popolo_cache_key(), popolo, len(data))
+        return popolo
+
+    async def _popolo_bytes(self, timer=NO_TIMER):
+        return await self.country.ep._fetch(
+            self.popolo_url, cache_key=self._popolo_cache_key(),
+            path=self.popolo_path, timer=timer)
+
+    async def _load_people_shard(self):
+        if self._people_shard is None:
+            shard = self._cached_people_shard()
+            if shard is None:
+                popolo = await self.popolo()
+                period_rows = []
+                for lp in self.legislative_periods():
+                    period_rows.append((lp.id, await lp.csv()))
+                shard = people_shard(popolo.json_data, period_rows)
+                self._store_people_shard(shard)
+            self._people_shard = shard
+        return self._people_shard
+
+    def _make_legislative_period(self, legislative_period_data):
+        return AsyncLegislativePeriod(
+            legislative_period_data, self, self.country)
+
+
+class AsyncLegislativePeriod(LegislativePeriod):
+
+    __slots__ = ()
+
+    async def csv(self, row_type='dict', columns=None, where=None):
+        """Return parsed data from the CSV of members during the period
+
+        This returns a list of one dict per row of the CSV file, where
+        the keys are the column headers, or one of the other
+        representations described in LegislativePeriod.csv, which also
+        describes columns and where."""
+        cacheable = columns is None and where is None and row_type == 'dict'
+        if cacheable and self.cached_csv is not None:
+            return self.cached_csv
+        with self._csv_timer() as timer:
+            data = timer.downloaded(await self._csv_bytes(timer))
+            rows = self._rows_from_bytes(data, row_type, columns, where)
+        if cacheable:
+            self.cached_csv = rows
+        return rows
+
+    def iter_csv(self, row_type='dict', columns=None, where=None):
+        """Streaming the CSV isn't supported by the asyncio API
+
+        This raises TypeError; use "await csv()" instead, which accepts
+        the same arguments."""
+        raise TypeError(
+            'AsyncLegislativePeriod.iter_csv() is not supported; '
+            'use "await csv()" instead')
+
+    async def diff(self, other):
+        """Return a PeriodDiff of the changes from this period to other"""
+        old_members, new_members = await asyncio.gather(
+            self._members(), other._members())
+        return diff_members(self, other, old_members, new_members)
+
+    async def _members(self):
+        with self._csv_timer() as timer:
+            data = timer.downloaded(await self._csv_bytes(timer))
+            return period_members(iter_records(iter_lines([data])))
+
+    async def _csv_bytes(self, timer=NO_TIMER):
+        return await self.country.ep._fetch(
+            self.csv_url, cache_key=self._csv_cache_key(),
+            path=self.legislative_period_data['csv'], timer=timer)
+
+
+def _raise_for_status(url, status):
+    if status >= 400:
+        raise aiohttp.ClientResponseError(
+            None, (), status=status,
+            message='{0} fetching {1}'.format(status, url))
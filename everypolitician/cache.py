@@ -0,0 +1,312 @@
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import errno
+import json
+import os
+import tempfile
+import threading
+
+
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+METADATA_SUFFIX = '.meta'
+
+
+class DiskCache(object):
+    """A size-capped on-disk cache of EveryPolitician data files
+
+    Entries are stored under a key which is a '/'-separated relative
+    path, e.g. the legislature's sha followed by the file's path in the
+    everypolitician-data repository.  Since a sha pins a file to an
+    immutable commit, those entries never need revalidating.  Each
+    entry can also have a small dict of metadata (such as the ETag and
+    Last-Modified headers of the response) stored alongside it.
+
+    When the total size of the cache goes over max_bytes, the least
+    recently used entries are removed."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def path_for(self, key):
+        """Return the filename that the entry for key is stored in"""
+        parts = [p for p in key.split('/') if p not in ('', '.', '..')]
+        return os.path.join(self.directory, *parts)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None if it's not cached"""
+        filename = self.path_for(key)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            with self._lock:
+                self.misses += 1
+            return None
+        self._touch(filename)
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(data)
+        return data
+
+    def open(self, key):
+        """Return a file object to read the entry for key from, or None
+
+        This is counted as a hit or miss in the same way as get()."""
+        filename = self.path_for(key)
+        try:
+            f = open(filename, 'rb')
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            with self._lock:
+                self.misses += 1
+            return None
+        self._touch(filename)
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += os.fstat(f.fileno()).st_size
+        return f
+
+    def record_miss(self):
+        """Count a lookup that had to go to the network after all"""
+        with self._lock:
+            self.misses += 1
+
+    def metadata(self, key):
+        """Return the metadata dict stored with key, or None"""
+        try:
+            with open(self.path_for(key) + METADATA_SUFFIX, 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+
+    def put(self, key, data, metadata=None):
+        """Store data (bytes) for key, then evict entries if over the cap"""
+        filename = self.path_for(key)
+        self._write_atomically(filename, data)
+        if metadata is not None:
+            self._write_atomically(
+                filename + METADATA_SUFFIX,
+                json.dumps(metadata).encode('utf-8'))
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += len(data)
+        self.evict()
+
+    def put_stream(self, key, chunks):
+        """Store the chunks of bytes for key while passing them through
+
+        This is a generator that yields each chunk from the iterable
+        chunks as it's written to disk.  The entry is only stored if
+        all the chunks are consumed."""
+        filename = self.path_for(key)
+        fd, tmp_filename = self._temporary_file(filename)
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            getattr(os, 'replace', os.rename)(tmp_filename, filename)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until under max_bytes"""
+        with self._lock:
+            if self._total_bytes is not None and \
+                    self._total_bytes <= self.max_bytes:
+                return
+            entries = list(self._entries())
+            total = sum(size for _, size, _ in entries)
+            entries.sort(key=lambda e: e[2])
+            for filename, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                for path in (filename, filename + METADATA_SUFFIX):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        if e.errno != errno.ENOENT:
+                            raise
+                total -= size
+            self._total_bytes = total
+
+    def stats(self):
+        """Return a dict of the hits, misses and bytes saved so far"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes_saved': self.bytes_saved,
+            }
+
+    def _entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for leafname in filenames:
+                if leafname.endswith(METADATA_SUFFIX) or \
+                        leafname.startswith('.tmp'):
+                    continue
+                filename = os.path.join(dirpath, leafname)
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue
+                yield filename, st.st_size, st.st_mtime
+
+    def _touch(self, filename):
+        # The modification time is used as the last access time for
+        # the LRU eviction, since atime is often disabled.
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+    def _temporary_file(self, filename):
+        directory = os.path.dirname(filename)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        return tempfile.mkstemp(prefix='.tmp', dir=directory)
+
+    def _write_atomically(self, filename, data):
+        fd, tmp_filename = self._temporary_file(filename)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            getattr(os, 'replace', os.rename)(tmp_filename, filename)
+        except Exception:
+            os.remove(tmp_filename)
+            raise
+
+    def __repr__(self):
+        return str('DiskCache({0!r}, max_bytes={1})').format(
+            self.directory, self.max_bytes)
+
+
+class _Load(object):
+    """A load of a MemoryCache entry that's in progress"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MemoryCache(object):
+    """A thread-safe in-memory LRU cache of loaded objects
+
+    The cache holds at most max_entries entries and at most max_bytes
+    of their approximate sizes (either limit can be None for no limit);
+    when it's full, the least recently used entries are dropped.
+
+    get_or_load() makes sure that, however many threads ask for the
+    same missing key at once, it's only loaded once: the other threads
+    wait for that load to finish and share its result."""
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._loads = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return the value for key, or None, marking it as recently used"""
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._entries[key] = entry
+        return entry[0]
+
+    def put(self, key, value, size=0):
+        """Store value for key, with size as its approximate size in bytes"""
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            # Evict the least recently used entries, but always keep the
+            # one that's just been added:
+            while len(self._entries) > 1 and self._over_limit():
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def _over_limit(self):
+        if self.max_entries is not None and \
+                len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and \
+            self.total_bytes > self.max_bytes
+
+    def get_or_load(self, key, load):
+        """Return the value for key, calling load() if it's not cached
+
+        load should return a (value, size) tuple.  If it raises an
+        exception, so does this (in every thread waiting for it)."""
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                return value
+            in_progress = self._loads.get(key)
+            if in_progress is None:
+                in_progress = self._loads[key] = _Load()
+                loading = True
+            else:
+                loading = False
+        if not loading:
+            in_progress.done.wait()
+            if in_progress.error is not None:
+                raise in_progress.error
+            return in_progress.value
+        try:
+            value, size = load()
+            in_progress.value = value
+            self.put(key, value, size)
+            return value
+        except BaseException as e:
+            in_progress.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._loads[key]
+            in_progress.done.set()
@@ -0,0 +1,73 @@
+"""Modules that are only imported when they're first used
+
+Importing requests (which popolo_data also imports) takes much longer
+than importing the rest of this package, and programs that only look
+up countries and legislatures in countries.json, or that fork worker
+processes, shouldn't have to wait for it.  So instead of importing such
+a module directly, a module here does:
+
+    requests = DeferredModule('requests')
+
+and the real module is imported the first time one of its attributes
+is used.  Since the attributes are looked up on the real module, patches
+like mock.patch('everypolitician.lib.requests.Session.get') still work.
+
+Names that a module has always provided, but which come from such a
+module, are set up with defer_attributes().
+"""
+
+import importlib
+import sys
+import types
+
+
+class DeferredModule(types.ModuleType):
+    """A stand-in for a module that imports it on first attribute access"""
+
+    def __init__(self, name):
+        super(DeferredModule, self).__init__(str(name))
+
+    def __getattr__(self, attr):
+        # Every lookup goes to the real module (rather than copying its
+        # attributes here), so that it sees any changes made to it:
+        module = sys.modules.get(self.__name__)
+        if module is None:
+            module = importlib.import_module(self.__name__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return str('<deferred module {0!r}>').format(self.__name__)
+
+
+def import_attribute(spec):
+    """Import and return what spec names
+
+    spec is either a module name, or 'module:attribute' for something
+    defined in a module."""
+    module_name, _, attr = spec.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attr) if attr else module
+
+
+def defer_attributes(module_name, specs):
+    """Import some attributes of a module the first time they're used
+
+    specs maps each attribute's name to a spec for import_attribute.
+    This works by changing the module's class, which needs Python 3.5
+    or later; on earlier versions, the attributes are imported now."""
+    module = sys.modules[module_name]
+    if sys.version_info < (3, 5):
+        for name, spec in specs.items():
+            setattr(module, name, import_attribute(spec))
+        return
+
+    class Module(types.ModuleType):
+
+        def __getattr__(self, name):
+            if name in specs:
+                return import_attribute(specs[name])
+            raise AttributeError(
+                'module {0!r} has no attribute {1!r}'.format(
+                    self.__name__, name))
+
+    module.__class__ = Module
@@ -0,0 +1,204 @@
+"""Counters and hooks for the files fetched by an EveryPolitician object
+
+Every time countries.json, a legislature's Popolo JSON or a legislative
+period's CSV file is loaded, a FetchEvent describing it is passed to
+each hook registered with the EveryPolitician object's Instrumentation,
+and added to its running totals:
+
+    def report(event):
+        metrics.histogram('everypolitician.' + event.kind).observe(
+            event.download_seconds + event.parse_seconds)
+
+    ep.instrumentation.add_hook(report)
+"""
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict, namedtuple
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Where the data for a fetch came from:
+SOURCES = ('network', 'revalidated', 'cache', 'snapshot', 'data_repo', 'file')
+
+
+class FetchEvent(namedtuple('FetchEvent', [
+        'kind', 'url', 'source', 'bytes', 'download_seconds',
+        'parse_seconds', 'retries', 'legislature', 'legislative_period',
+        'error'])):
+    """A record of one file being loaded
+
+    kind is 'countries_json', 'popolo' or 'csv', and source is one of
+    SOURCES: 'network' if it was downloaded, 'revalidated' if a cached
+    copy was confirmed to be current with a conditional request, or
+    'cache', 'snapshot', 'data_repo' or 'file' if it was read locally.
+    download_seconds is the time spent getting the bytes, wherever they
+    came from, and parse_seconds the time spent parsing them; for a CSV
+    file that's streamed, these are interleaved, and for files parsed
+    in bulk (as by load_popolo_many) parse_seconds is 0.  retries is the number
+    of times the request was retried.  legislature and
+    legislative_period are the objects the file belongs to, if any, and
+    error is the exception that stopped the file being loaded, or None."""
+
+    __slots__ = ()
+
+    @property
+    def cache_hit(self):
+        return self.source not in ('network', 'revalidated')
+
+
+class FetchTimer(object):
+    """Time one fetch, and report it to an Instrumentation when finished
+
+    This is a context manager; on leaving the with block, the event is
+    recorded, with the exception that was raised (if any) as its error.
+    Code that gets the data sets source and retries, and calls
+    downloaded() once it has all the bytes (or wraps a stream of chunks
+    with timed_chunks())."""
+
+    def __init__(self, instrumentation, kind, url, legislature=None,
+                 legislative_period=None):
+        self.instrumentation = instrumentation
+        self.kind = kind
+        self.url = url
+        self.legislature = legislature
+        self.legislative_period = legislative_period
+        self.source = 'network'
+        self.retries = 0
+        self.bytes = 0
+        self.download_seconds = None
+        self._start = None
+
+    def __enter__(self):
+        self._start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total = _clock() - self._start
+        if self.download_seconds is None:
+            self.download_seconds = total
+        if exc_type is GeneratorExit:
+            # A streamed CSV file that wasn't read to the end
+            exc = None
+        self.instrumentation.record(FetchEvent(
+            self.kind, self.url, self.source, self.bytes,
+            self.download_seconds, total - self.download_seconds,
+            self.retries, self.legislature, self.legislative_period, exc))
+        return False
+
+    def downloaded(self, data):
+        """Note that all the bytes in data have been fetched"""
+        self.bytes = len(data)
+        self.download_seconds = _clock() - self._start
+        return data
+
+    def timed_chunks(self, chunks):
+        """Yield chunks, adding up their size and the time taken to get them"""
+        self.download_seconds = 0
+        chunks = iter(chunks)
+        while True:
+            start = _clock()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self.download_seconds += _clock() - start
+                return
+            self.download_seconds += _clock() - start
+            self.bytes += len(chunk)
+            yield chunk
+
+
+class _NoTimer(object):
+    """A stand-in for a FetchTimer when a fetch isn't being timed"""
+
+    __slots__ = ()
+
+    source = None
+    retries = 0
+
+    def __setattr__(self, name, value):
+        pass
+
+    def downloaded(self, data):
+        return data
+
+    def timed_chunks(self, chunks):
+        return chunks
+
+
+NO_TIMER = _NoTimer()
+
+
+def response_retries(response):
+    """Return how many times the request for a requests response was retried"""
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    history = getattr(retries, 'history', None)
+    return len(history) if history else 0
+
+
+class Instrumentation(object):
+    """Hooks called with a FetchEvent for each fetch, and running totals"""
+
+    def __init__(self):
+        self.hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add_hook(self, hook):
+        """Call hook(event) with a FetchEvent after each fetch
+
+        Hooks are called in the thread that did the fetch, so they
+        should be quick and thread-safe.  An exception raised by a hook
+        is logged, and doesn't stop the data being loaded."""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def timer(self, kind, url, legislature=None, legislative_period=None):
+        return FetchTimer(self, kind, url, legislature, legislative_period)
+
+    def record(self, event):
+        with self._lock:
+            counters = self._counters
+            counters['fetches'] += 1
+            if event.error is not None:
+                counters['errors'] += 1
+            elif event.cache_hit:
+                counters['cache_hits'] += 1
+            else:
+                counters['cache_misses'] += 1
+            counters['bytes'] += event.bytes
+            counters['download_seconds'] += event.download_seconds
+            counters['parse_seconds'] += event.parse_seconds
+            counters['retries'] += event.retries
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception('Instrumentation hook %r failed', hook)
+
+    def stats(self):
+        """Return the totals for all the fetches so far, as a dict"""
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        """Set all the totals back to zero"""
+        with self._lock:
+            self._counters = OrderedDict([
+                ('fetches', 0),
+                ('cache_hits', 0),
+                ('cache_misses', 0),
+                ('errors', 0),
+                ('bytes', 0),
+                ('download_seconds', 0.0),
+                ('parse_seconds', 0.0),
+                ('retries', 0),
+            ])
@@ -0,0 +1,107 @@
+from __future__ import unicode_literals
+
+import calendar
+from datetime import date, datetime
+
+from .deferred import DeferredModule
+
+
+six = DeferredModule('six')
+
+
+def parse_date(value, end=False):
+    """Return a datetime.date for an ISO 8601 date, which may be partial
+
+    EveryPolitician dates can be just a year ('2015') or a year and a
+    month ('2015-11') as well as a full date.  A partial date is taken
+    to be its first day, or its last day if end is True, so that a
+    period ending in '2015' includes all of 2015.  value can also be a
+    date or datetime, and None is returned unchanged."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, six.string_types):
+        raise TypeError('Not a date: {0!r}'.format(value))
+    parts = [int(p) for p in value.split('-')]
+    if len(parts) == 1:
+        year, = parts
+        return date(year, 12, 31) if end else date(year, 1, 1)
+    if len(parts) == 2:
+        year, month = parts
+        if end:
+            return date(year, month, calendar.monthrange(year, month)[1])
+        return date(year, month, 1)
+    if len(parts) == 3:
+        return date(*parts)
+    raise ValueError('Not an ISO 8601 date: {0!r}'.format(value))
+
+
+class IntervalIndex(object):
+    """A static index of date intervals for fast overlap queries
+
+    intervals is an iterable of (start, end, value) tuples, where start
+    and end are datetime.date objects and both ends are inclusive.  An
+    end of None means that the interval is still open.  Intervals with
+    no start are left out, since they can't be placed in time.
+
+    The intervals are kept sorted by start date, and that array is
+    treated as an implicit balanced binary tree in which each node
+    records the latest end date in its subtree, so finding the k
+    intervals that overlap a query takes O(log n + k) time."""
+
+    def __init__(self, intervals):
+        items = sorted(
+            ((start, date.max if end is None else end, value)
+             for start, end, value in intervals if start is not None),
+            key=lambda item: item[0])
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._values = [item[2] for item in items]
+        self._max_end = [None] * len(items)
+        self._build(0, len(items))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return date.min
+        mid = (lo + hi) // 2
+        max_end = max(
+            self._ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        self._max_end[mid] = max_end
+        return max_end
+
+    def __len__(self):
+        return len(self._values)
+
+    def last(self):
+        """Return the value of the interval that starts latest, or None"""
+        return self._values[-1] if self._values else None
+
+    def overlapping(self, start, end):
+        """Return the values of intervals overlapping start to end inclusive
+
+        The values are returned in order of their interval's start date."""
+        found = []
+        self._query(0, len(self._values), start, end, found)
+        return [self._values[i] for i in found]
+
+    def containing(self, point):
+        """Return the values of intervals that include the date point"""
+        return self.overlapping(point, point)
+
+    def _query(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] < start:
+            # Everything in this subtree ended before the query started
+            return
+        self._query(lo, mid, start, end, found)
+        if self._starts[mid] > end:
+            # This and everything after it starts after the query ends
+            return
+        if self._ends[mid] >= start:
+            found.append(mid)
+        self._query(mid + 1, hi, start, end, found)
@@ -0,0 +1,210 @@
+from __future__ import unicode_literals
+
+from array import array
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+import json
+import re
+import threading
+
+
+_STRING = br'"[^"\\]*(?:\\.[^"\\]*)*"'
+
+# Anything up to and including the next character that opens or closes
+# an array or object.  Strings are matched whole, so that brackets in
+# them are skipped over.
+_BRACKET_RE = re.compile(
+    br'[^"\[\]{}]*(?:' + _STRING + br'[^"\[\]{}]*)*([\[\]{}])')
+
+_SLUG_RE = re.compile(br'"slug"\s*:\s*(' + _STRING + br')')
+
+
+def scan_countries_json(data):
+    """Find where each country is in the bytes of countries.json
+
+    This returns a list of (slug, start, end) tuples, one per element
+    of the top-level array, giving the country's slug and the byte
+    offsets of its JSON object in data, without parsing any of the
+    objects.  If a country has no slug, its slug is None."""
+    countries = []
+    depth = 0
+    start = None
+    slug = None
+    for m in _BRACKET_RE.finditer(data):
+        if depth == 2 and slug is None:
+            # Look for the slug among the country's own keys, which
+            # are the ones between brackets at this depth:
+            slug_match = _SLUG_RE.search(data, m.start(), m.start(1))
+            if slug_match:
+                slug = json.loads(slug_match.group(1).decode('utf-8'))
+        if m.group(1) in (b'[', b'{'):
+            depth += 1
+            if depth == 2:
+                start = m.start(1)
+                slug = None
+        else:
+            depth -= 1
+            if depth == 1:
+                countries.append((slug, start, m.end()))
+    if depth != 0:
+        raise ValueError('Unbalanced brackets in countries.json')
+    return countries
+
+
+def _offset_typecode():
+    try:
+        array(str('q'))
+    except ValueError:
+        # Python 2 has no 'q', but 'l' is 64 bits on most platforms
+        return str('l')
+    return str('q')
+
+
+OFFSET_TYPECODE = _offset_typecode()
+
+
+class SlugTable(Sequence):
+    """A list of slugs (or None) kept in a few flat buffers
+
+    The slugs are stored end to end, UTF-8 encoded, in one bytes object,
+    with their offsets in an array, and another array lists them in
+    sorted order so that they can be looked up by binary search.  There
+    are no per-slug Python objects, so when a process forks, reading
+    the table doesn't change reference counts all over its memory and
+    make the child copy it."""
+
+    def __init__(self, slugs):
+        encoded = []
+        self._offsets = array(OFFSET_TYPECODE, [0])
+        self._present = array(str('b'))
+        for slug in slugs:
+            slug_bytes = b'' if slug is None else slug.encode('utf-8')
+            encoded.append(slug_bytes)
+            self._offsets.append(self._offsets[-1] + len(slug_bytes))
+            self._present.append(slug is not None)
+        self._buffer = b''.join(encoded)
+        self._sorted = array(OFFSET_TYPECODE, sorted(
+            (i for i in range(len(encoded)) if self._present[i]),
+            key=lambda i: (encoded[i], i)))
+
+    def __len__(self):
+        return len(self._present)
+
+    def _encoded(self, i):
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('SlugTable index out of range')
+        if not self._present[i]:
+            return None
+        return self._encoded(i).decode('utf-8')
+
+    def position(self, slug):
+        """Return the position of the first occurrence of slug
+
+        This raises KeyError if slug isn't in the table."""
+        if slug is None:
+            raise KeyError(slug)
+        key = slug.encode('utf-8')
+        lo, hi = 0, len(self._sorted)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._encoded(self._sorted[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._sorted) and \
+                self._encoded(self._sorted[lo]) == key:
+            return self._sorted[lo]
+        raise KeyError(slug)
+
+
+class SlugIndex(Mapping):
+    """A read-only mapping from each slug in a SlugTable to its position"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, slug):
+        return self._table.position(slug)
+
+    def __iter__(self):
+        seen = set()
+        for slug in self._table:
+            if slug is not None and slug not in seen:
+                seen.add(slug)
+                yield slug
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class LazyCountriesData(Sequence):
+    """The countries.json data, with each country only parsed when used
+
+    This behaves like the list of country dicts that parsing the whole
+    file would give, but creating it only scans the raw bytes to find
+    where each country's JSON object is, and each of those is parsed
+    the first time it's accessed.  The raw bytes are released once
+    every country has been parsed.  It's safe to use from several
+    threads at once: each country is only parsed once.
+
+    The index of where each country is, and of their slugs, is kept in
+    flat arrays (see SlugTable), so that processes forked after it's
+    built can share it without copying it."""
+
+    def __init__(self, data, countries=None):
+        """countries, if given, is the result of scan_countries_json(data)"""
+        self._data = data
+        if countries is None:
+            countries = scan_countries_json(data)
+        self._set_countries(countries)
+
+    def _set_countries(self, countries):
+        """Set up the index from (slug, start, end) tuples"""
+        self._starts = array(OFFSET_TYPECODE)
+        self._ends = array(OFFSET_TYPECODE)
+        slugs = []
+        for slug, start, end in countries:
+            self._starts.append(start)
+            self._ends.append(end)
+            slugs.append(slug)
+        self.slugs = SlugTable(slugs)
+        self.slug_index = SlugIndex(self.slugs)
+        self._parsed = [None] * len(self._starts)
+        self._unparsed_count = len(self._starts)
+        self.lock = threading.RLock()
+
+    def _load(self, start, end):
+        """Parse the country whose JSON is between start and end"""
+        return json.loads(self._data[start:end].decode('utf-8'))
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        country_data = self._parsed[i]
+        if country_data is None:
+            with self.lock:
+                country_data = self._parsed[i]
+                if country_data is None:
+                    country_data = self._load(
+                        self._starts[i], self._ends[i])
+                    self._parsed[i] = country_data
+                    self._unparsed_count -= 1
+                    if self._unparsed_count == 0:
+                        self._data = None
+        return country_data
+
+    def is_parsed(self, i):
+        """Return whether the country at index i has been parsed yet"""
+        return self._parsed[i] is not None
@@ -1,34 +1,204 @@
 from __future__ import unicode_literals
 
-import csv
-from datetime import datetime
-import io
+from collections import namedtuple
+from contextlib import closing
+from datetime import date, datetime
+import gc
 import json
+import marshal
+import os
+import sys
+import threading
 
-import requests
-import six
+from .cache import DEFAULT_CACHE_MAX_BYTES, DiskCache, MemoryCache
+from .instrumentation import NO_TIMER, Instrumentation, response_retries
+from .intervals import IntervalIndex, parse_date
+from .lazy import LazyCountriesData, scan_countries_json
+from .rows import (
+    columns_from_records, iter_lines, iter_records, rows_from_records,
+    select_records)
+from .people import PeopleIndex, people_shard
+from .snapshot import Snapshot, json_bytes, write_snapshot
+from .deferred import DeferredModule, defer_attributes
+from .tables import MembershipsTable
+from .turnover import consecutive_diffs, diff_members, period_members
 
-from popolo_data.importer import Popolo
+
+# (These must be native strings for "import *" on Python 2.)
+__all__ = [str(name) for name in (
+    'Changeset', 'Country', 'DEFAULT_COUNTRIES_JSON_URL',
+    'DEFAULT_DATA_BASE_URL', 'DEFAULT_PREFETCH_WORKERS', 'DEFAULT_TIMEOUT',
+    'EveryPolitician', 'Legislature', 'LegislativePeriod', 'NotFound',
+    'PrefetchResult', 'freeze_objects', 'make_session', 'unicode_dict',
+)]
+
+requests = DeferredModule('requests')
+six = DeferredModule('six')
+
+# Popolo has always been available from this module, but popolo_data is
+# now only imported when it's first used.  (It's left out of __all__ so
+# that "from .lib import *" doesn't import it.)
+defer_attributes(__name__, {'Popolo': 'popolo_data.importer:Popolo'})
+
+
+def python_2_unicode_compatible(cls):
+    """Like six.python_2_unicode_compatible, without importing six on Python 3"""
+    if sys.version_info[0] == 2:
+        return six.python_2_unicode_compatible(cls)
+    return cls
 
 
 DEFAULT_COUNTRIES_JSON_URL = \
     'https://raw.githubusercontent.com/everypolitician/' \
     'everypolitician-data/master/countries.json'
 
+DEFAULT_DATA_BASE_URL = \
+    'https://raw.githubusercontent.com/everypolitician/everypolitician-data'
+
+DEFAULT_TIMEOUT = 30
+
+DEFAULT_PREFETCH_WORKERS = 8
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class NotFound(Exception):
     pass
 
 
-@six.python_2_unicode_compatible
+def make_session(pool_connections=10, pool_maxsize=10, max_retries=3,
+                 backoff_factor=0.5):
+    """Return a requests Session suitable for fetching EveryPolitician data
+
+    The session keeps up to pool_maxsize connections alive per host
+    (for up to pool_connections hosts), asks for gzip-compressed
+    responses and retries failed requests up to max_retries times with
+    exponential backoff."""
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
+    session = requests.Session()
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504))
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
+
+
+def legislature_version(legislature_data):
+    """Return what identifies the version of a legislature's data"""
+    return legislature_data['sha'], legislature_data['lastmod']
+
+
+def legislature_versions(countries_json_data):
+    """Return a dict mapping (country slug, legislature slug) to the
+    legislature_version() of each legislature in countries_json_data"""
+    return dict(
+        ((country_data['slug'], legislature_data['slug']),
+         legislature_version(legislature_data))
+        for country_data in countries_json_data
+        for legislature_data in country_data['legislatures'])
+
+
+Changeset = namedtuple('Changeset', ['added', 'removed', 'changed'])
+Changeset.__doc__ = """The legislatures that changed in EveryPolitician.refresh
+
+Each of added, removed and changed is a list of (country slug,
+legislature slug) tuples."""
+
+
+PrefetchResult = namedtuple('PrefetchResult', ['loaded', 'errors'])
+PrefetchResult.__doc__ = """The outcome of EveryPolitician.prefetch
+
+loaded is a list of (object, kind) tuples that were loaded successfully
+and errors is a list of (object, kind, exception) tuples for those that
+failed."""
+
+
+def parse_popolo_json(data):
+    """Parse the bytes of a Popolo JSON file in a worker process
+
+    The result is sent back marshalled, since the parent process can
+    load that much faster than it could parse the JSON itself."""
+    return marshal.dumps(json.loads(data.decode('utf-8')))
+
+
+def transform_popolo_json(transform, data):
+    """Parse Popolo JSON in a worker process and return transform(json_data)"""
+    return transform(json.loads(data.decode('utf-8')))
+
+
+@python_2_unicode_compatible
 class EveryPolitician(object):
     """A class to load, parses and make accessible the EP countries.json file"""
 
-    def __init__(self, countries_json_url=None, countries_json_filename=None):
-        """Initialize from either a remote or local countries.json file"""
+    def __init__(self, countries_json_url=None, countries_json_filename=None,
+                 cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 session=None, timeout=DEFAULT_TIMEOUT,
+                 data_base_url=DEFAULT_DATA_BASE_URL, lazy=False,
+                 data_repo_path=None, popolo_cache_max_entries=None,
+                 popolo_cache_max_bytes=None):
+        """Initialize from either a remote or local countries.json file
+
+        If cache_dir is given, downloaded files are kept in that
+        directory (up to cache_max_bytes in total) and reused by later
+        loads, even from other processes.
+
+        All downloads go through one requests Session, so connections
+        are reused; you can pass in your own as session, otherwise one
+        is created with make_session().  timeout is passed to every
+        request.
+
+        data_base_url is the URL that the legislative period CSV files
+        are found under (followed by a commit sha and their path), which
+        you can change to use a mirror of everypolitician-data.
+
+        If lazy is True, countries.json is only scanned to find where
+        each country is when it's loaded, and each country's data is
+        parsed the first time that country is used; see
+        LazyCountriesData.  Scanning takes about as long as parsing the
+        whole file, so this only makes loading faster when there's a
+        cache_dir, where the result of the scan is kept for next time.
+
+        If data_repo_path is the path of a local clone of the
+        everypolitician-data repository, all the data is read from the
+        files there instead of being downloaded, and countries.json is
+        read from it unless countries_json_filename is given.
+
+        Loaded Popolo data is kept in a MemoryCache shared by all the
+        legislatures, which can be limited to popolo_cache_max_entries
+        legislatures, or to roughly popolo_cache_max_bytes (measured by
+        the size of the JSON), dropping the least recently used."""
+        self.lazy = lazy
+        self.data_repo_path = data_repo_path
+        self._session = session
+        self._owns_session = session is None
+        self.timeout = timeout
+        self.data_base_url = data_base_url
         self.countries_json_filename = None
         self.countries_json_url = None
         self._countries_json_data = None
+        self._countries = None
+        self._countries_by_slug = None
+        self._period_index = None
+        self._snapshot = None
+        self._countries_json_lock = threading.Lock()
+        self.instrumentation = Instrumentation()
+        self.popolo_cache = MemoryCache(
+            max_entries=popolo_cache_max_entries,
+            max_bytes=popolo_cache_max_bytes)
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = DiskCache(cache_dir, max_bytes=cache_max_bytes)
+        if countries_json_filename is None and data_repo_path is not None:
+            countries_json_filename = os.path.join(
+                data_repo_path, 'countries.json')
         if countries_json_filename is None:
             # Then get the data from a URL:
             if countries_json_url is None:
@@ -40,31 +210,368 @@ class EveryPolitician(object):
 
     def countries_json_data(self):
         """Return countries JSON data parsed into Python data structures"""
-        if self._countries_json_data is not None:
-            return self._countries_json_data
+        if self._countries_json_data is None:
+            with self._countries_json_lock:
+                if self._countries_json_data is None:
+                    self._load_countries_json()
+        return self._countries_json_data
+
+    def _load_countries_json(self):
+        with self._countries_json_timer() as timer:
+            data = timer.downloaded(self._read_countries_json(timer))
+            self._countries_json_data = self._parse_countries_json(data)
+
+    def _countries_json_timer(self):
+        return self.instrumentation.timer(
+            'countries_json',
+            self.countries_json_filename or self.countries_json_url)
+
+    @classmethod
+    def from_snapshot(cls, filename, **kwargs):
+        """Create an EveryPolitician object from a snapshot file
+
+        The snapshot is memory-mapped, and each country and data file
+        in it is only decoded when it's first used.  Any data that isn't
+        in the snapshot is downloaded as usual.  Other keyword arguments
+        are passed on to the constructor."""
+        snapshot = Snapshot(filename)
+        kwargs.setdefault('countries_json_url', snapshot.countries_json_url)
+        kwargs['lazy'] = True
+        ep = cls(**kwargs)
+        ep._snapshot = snapshot
+        ep._countries_json_data = snapshot.countries_json_data()
+        return ep
+
+    def save_snapshot(self, filename):
+        """Save all the data loaded so far to a snapshot file
+
+        The snapshot contains countries.json and the Popolo JSON and
+        legislative period CSV files that have been loaded, e.g. with
+        prefetch().  Use from_snapshot() to load it again."""
+        write_snapshot(self, filename)
+
+    def close(self):
+        """Close the session, if it was created by this object, and the
+        snapshot file this was created from, if any
+
+        Nothing that's still to be read from the snapshot can be used
+        after this.  The object can also be used in a "with" statement,
+        which closes it at the end."""
+        self._close_owned_session()
+        self._close_snapshot()
+
+    def _close_owned_session(self):
+        if self._owns_session and self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _close_snapshot(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _read_countries_json(self, timer=NO_TIMER):
+        """Return the bytes of countries.json, from the file or URL"""
         if self.countries_json_filename is not None:
-            with open(self.countries_json_filename) as f:
-                self._countries_json_data = json.load(f)
+            timer.source = 'file'
+            # The file is read rather than memory-mapped, even when
+            # lazy, since it may be rewritten in place (e.g. by a sync
+            # job updating data_repo_path) while it's still in use:
+            with open(self.countries_json_filename, 'rb') as f:
+                return f.read()
+        return self._fetch_revalidated(self.countries_json_url, timer)
+
+    def refresh(self):
+        """Load countries.json again, keeping whatever hasn't changed
+
+        The legislatures in the new countries.json are compared with
+        those already loaded by their sha and lastmod.  Unchanged
+        legislatures keep their cached Popolo and CSV data, while those
+        that have changed are reset, so their data is loaded again when
+        it's next used.  The same Country and Legislature objects are
+        kept for countries and legislatures that are still present.
+
+        This returns a Changeset listing the (country slug, legislature
+        slug) of each legislature that was added, removed or changed.
+        With lazy=True or a snapshot, only the countries that have been
+        used are compared and listed, and the rest of the new data is
+        left unparsed, since nothing was loaded for them."""
+        with self._countries_json_timer() as timer:
+            data = timer.downloaded(self._read_countries_json(timer))
+            data = self._parse_countries_json(data)
+        return self._apply_refresh(data)
+
+    def _apply_refresh(self, new_countries_json_data):
+        old_countries = self._countries_by_slug or {}
+        lazy = isinstance(new_countries_json_data, LazyCountriesData)
+        if lazy:
+            # Only the countries that have been used are compared, so
+            # that the rest of the new data is left unparsed:
+            old_versions = legislature_versions(
+                country.country_data for country in old_countries.values())
+            slug_index = new_countries_json_data.slug_index
+            new_data = [
+                new_countries_json_data[i] for i in sorted(
+                    slug_index[slug] for slug in old_countries
+                    if slug in slug_index)]
         else:
-            r = requests.get(self.countries_json_url)
+            old_data = self._countries_json_data
+            old_versions = legislature_versions(old_data or [])
+            new_data = new_countries_json_data
+        changes = Changeset([], [], [])
+        countries = []
+        by_slug = {}
+        for country_data in new_data:
+            country = old_countries.get(country_data['slug'])
+            if country is None or country.slug in by_slug:
+                country = self._make_country(country_data)
+            old_legislatures = country._legislatures_by_slug or {}
+            legislatures = []
+            for legislature_data in country_data['legislatures']:
+                key = (country.slug, legislature_data['slug'])
+                old_version = old_versions.pop(key, None)
+                legislature = old_legislatures.get(legislature_data['slug'])
+                if old_version is None:
+                    changes.added.append(key)
+                    legislature = None
+                elif old_version != legislature_version(legislature_data):
+                    changes.changed.append(key)
+                    legislature = None
+                if legislature is None or legislature in legislatures:
+                    legislature = country._make_legislature(legislature_data)
+                else:
+                    legislature.legislature_data = legislature_data
+                legislatures.append(legislature)
+            country._set_data(country_data, legislatures)
+            countries.append(country)
+            by_slug.setdefault(country.slug, country)
+        changes.removed.extend(sorted(old_versions))
+        self._countries_json_data = new_countries_json_data
+        # With lazy data, the full list is built again when it's needed,
+        # from the countries kept in by_slug and the new data:
+        self._countries = None if lazy else countries
+        self._countries_by_slug = by_slug
+        self._period_index = None
+        return changes
+
+    def _parse_countries_json(self, data):
+        if self.lazy:
+            return LazyCountriesData(data, self._scan_countries_json(data))
+        return json.loads(data.decode('utf-8'))
+
+    def _scan_countries_json(self, data):
+        """Return scan_countries_json(data), from the cache if possible
+
+        The result is cached under a hash of the data, so it's reused
+        for as long as countries.json hasn't changed."""
+        if self.cache is None:
+            return scan_countries_json(data)
+        import hashlib
+        cache_key = 'countries-json-index-v1/{0}'.format(
+            hashlib.sha1(data).hexdigest())
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return [tuple(c) for c in json.loads(cached.decode('utf-8'))]
+        countries = scan_countries_json(data)
+        self.cache.put(cache_key, json_bytes(countries))
+        return countries
+
+    def _loaded_countries_json_data(self):
+        return self.countries_json_data()
+
+    @property
+    def session(self):
+        """Return the requests Session used for all downloads"""
+        if self._session is None:
+            self._session = make_session()
+        return self._session
+
+    def _get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def data_repo_filename(self, path):
+        """Return the local filename of a path in everypolitician-data
+
+        This returns None if there's no data_repo_path."""
+        if self.data_repo_path is None:
+            return None
+        return os.path.join(self.data_repo_path, *path.split('/'))
+
+    def _fetch(self, url, cache_key=None, path=None, timer=NO_TIMER):
+        """Return the contents of url as bytes
+
+        If there's an on-disk cache and a cache_key is given, the file
+        is only downloaded if it isn't already in the cache.  This
+        should only be used for URLs whose contents never change, like
+        those that include a commit sha.  If there's a data_repo_path,
+        the file at path in the repository is read instead.  Where the
+        data came from is noted on timer, if it's a FetchTimer."""
+        if self.data_repo_path is not None and path is not None:
+            timer.source = 'data_repo'
+            with open(self.data_repo_filename(path), 'rb') as f:
+                return f.read()
+        if self._snapshot is not None and cache_key is not None:
+            data = self._snapshot.get(cache_key)
+            if data is not None:
+                timer.source = 'snapshot'
+                return data
+        if self.cache is not None and cache_key is not None:
+            data = self.cache.get(cache_key)
+            if data is not None:
+                timer.source = 'cache'
+                return data
+        r = self._get(url)
+        timer.retries = response_retries(r)
+        r.raise_for_status()
+        if self.cache is not None and cache_key is not None:
+            self.cache.put(cache_key, r.content)
+        return r.content
+
+    def _fetch_chunks(self, url, cache_key=None, path=None, timer=NO_TIMER):
+        """Yield the contents of url as a series of chunks of bytes
+
+        This streams the response (or the file from the on-disk cache or
+        data_repo_path) rather than reading it all into memory.  A
+        streamed response is written to the cache as it's read."""
+        f = None
+        if self.data_repo_path is not None and path is not None:
+            timer.source = 'data_repo'
+            f = open(self.data_repo_filename(path), 'rb')
+        elif self._snapshot is not None and cache_key is not None:
+            data = self._snapshot.get(cache_key)
+            if data is not None:
+                timer.source = 'snapshot'
+                yield data
+                return
+        if f is None and self.cache is not None and cache_key is not None:
+            f = self.cache.open(cache_key)
+            if f is not None:
+                timer.source = 'cache'
+        if f is not None:
+            with f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                    yield chunk
+            return
+        with closing(self._get(url, stream=True)) as r:
+            timer.retries = response_retries(r)
             r.raise_for_status()
-            self._countries_json_data = r.json()
-        return self._countries_json_data
+            chunks = r.iter_content(STREAM_CHUNK_SIZE)
+            if self.cache is not None and cache_key is not None:
+                chunks = self.cache.put_stream(cache_key, chunks)
+            for chunk in chunks:
+                yield chunk
+
+    def _fetch_revalidated(self, url, timer=NO_TIMER):
+        """Return the contents of url, checking that any cached copy is current
+
+        A cached copy is revalidated with a conditional request using
+        the ETag and Last-Modified headers from when it was stored."""
+        if self.cache is None:
+            return self._fetch(url, timer=timer)
+        cache_key = self._url_cache_key(url)
+        r = self._get(url, headers=self._revalidation_headers(cache_key))
+        timer.retries = response_retries(r)
+        if r.status_code == 304:
+            data = self.cache.get(cache_key)
+            if data is not None:
+                timer.source = 'revalidated'
+                return data
+            r = self._get(url)
+            timer.retries += response_retries(r)
+        r.raise_for_status()
+        self._store_revalidated(cache_key, url, r.content, r.headers)
+        return r.content
+
+    def _url_cache_key(self, url):
+        import hashlib
+        return 'urls/{0}'.format(hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _revalidation_headers(self, cache_key):
+        """Return headers for a conditional request for a cached URL"""
+        headers = {}
+        metadata = self.cache.metadata(cache_key)
+        if metadata is not None:
+            if metadata.get('etag'):
+                headers['If-None-Match'] = metadata['etag']
+            if metadata.get('last_modified'):
+                headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
+
+    def _store_revalidated(self, cache_key, url, data, response_headers):
+        self.cache.record_miss()
+        self.cache.put(cache_key, data, {
+            'url': url,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+        })
+
+    def cache_stats(self):
+        """Return a dict with the hits, misses and bytes saved by the cache
+
+        If this object has no on-disk cache, all of these are zero."""
+        if self.cache is None:
+            return {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+        return self.cache.stats()
+
+    def _country_index(self):
+        """Build (once) the list of Country objects and the slug index
+
+        The same Country instances are returned by every subsequent
+        call, so anything cached on them is kept between lookups."""
+        if self._countries is None:
+            self._index_countries(self._loaded_countries_json_data())
+        return self._countries, self._countries_by_slug
+
+    def _index_countries(self, countries_json_data):
+        # Countries already created by a lazy lookup are reused:
+        existing = self._countries_by_slug or {}
+        countries = []
+        by_slug = {}
+        for country_data in countries_json_data:
+            c = existing.get(country_data['slug'])
+            if c is None or c.country_data is not country_data:
+                c = self._make_country(country_data)
+            countries.append(c)
+            by_slug.setdefault(c.slug, c)
+        self._countries = countries
+        self._countries_by_slug = by_slug
+
+    def _lazy_country(self, country_slug):
+        """Return a Country, only parsing that country's data if need be"""
+        data = self._loaded_countries_json_data()
+        with data.lock:
+            if self._countries_by_slug is None:
+                self._countries_by_slug = {}
+            country = self._countries_by_slug.get(country_slug)
+            if country is None:
+                country = self._countries_by_slug.setdefault(
+                    country_slug,
+                    self._make_country(data[data.slug_index[country_slug]]))
+        return country
+
+    def _make_country(self, country_data):
+        return Country(country_data, self)
 
     def countries(self):
         """Return a list of all known countries"""
-        return [
-            Country(country_data) for country_data
-            in self.countries_json_data()
-        ]
+        return list(self._country_index()[0])
 
     def country(self, country_slug):
         """Return an Country object from a country slug"""
-        for c in self.countries():
-            if c.slug == country_slug:
-                return c
-        raise NotFound("Couldn't find the country with slug '{0}'".format(
-            country_slug))
+        try:
+            if self._countries is None and self.lazy:
+                return self._lazy_country(country_slug)
+            return self._country_index()[1][country_slug]
+        except KeyError:
+            raise NotFound("Couldn't find the country with slug '{0}'".format(
+                country_slug))
 
     def country_legislature(self, country_slug, legislature_slug):
         """Return a tuple of Country and Legislature objects from their slugs"""
@@ -72,6 +579,207 @@ class EveryPolitician(object):
         legislature = country.legislature(legislature_slug)
         return country, legislature
 
+    def periods_overlapping(self, start, end):
+        """Return all the legislative periods that overlap start to end
+
+        start and end can be datetime.date objects or ISO 8601 dates,
+        which may be partial: '2015' as the end means the end of 2015.
+        The periods are returned in order of their start date.  Periods
+        with no start date are never returned, and those with no end
+        date are treated as still going on."""
+        return self._periods_index().overlapping(
+            parse_date(start), parse_date(end, end=True))
+
+    def _periods_index(self):
+        if self._period_index is None:
+            self._period_index = IntervalIndex(
+                period_interval(lp)
+                for country in self._country_index()[0]
+                for legislature in country.legislatures()
+                for lp in legislature.legislative_periods())
+        return self._period_index
+
+    def people_index(self, country_slugs=None):
+        """Return a PeopleIndex of the members of every legislature
+
+        Only the countries with the given slugs are included, or all
+        countries if country_slugs is None.  Each legislature's part of
+        the index is built from its Popolo data and CSV files the first
+        time it's needed, and stored under its sha in the on-disk cache
+        (if there is one), so after a refresh only the legislatures
+        that have changed are indexed again."""
+        index = PeopleIndex()
+        for country in self._countries_for(country_slugs):
+            for legislature in country.legislatures():
+                index.add(legislature, legislature._load_people_shard())
+        return index
+
+    def memberships_table(self, country_slugs=None, periods='all',
+                          columns=None, where=None):
+        """Return a MembershipsTable of the CSV rows of many periods
+
+        The rows of every legislative period in the countries with the
+        given slugs (or all countries) are included if periods is 'all',
+        or just those of each legislature's latest legislative period if
+        it's 'latest'.  columns and where are as for LegislativePeriod.csv.
+        The CSV files are streamed straight into the table, without
+        building a dict for each row."""
+        table = MembershipsTable()
+        countries = self._countries_for(country_slugs)
+        for lp in self._periods_for(countries, periods):
+            table.add(lp, select_records(
+                lp._iter_csv_records(), columns, where))
+        return table
+
+    def _periods_for(self, countries, periods):
+        if periods not in ('all', 'latest'):
+            raise ValueError('Unknown periods: {0}'.format(periods))
+        legislative_periods = []
+        for country in countries:
+            for legislature in country.legislatures():
+                if periods == 'latest':
+                    latest = legislature.latest_legislative_period()
+                    if latest is not None:
+                        legislative_periods.append(latest)
+                else:
+                    legislative_periods.extend(
+                        legislature.legislative_periods())
+        return legislative_periods
+
+    def _countries_for(self, country_slugs):
+        if country_slugs is None:
+            return self.countries()
+        return [self.country(slug) for slug in country_slugs]
+
+    def prefetch(self, country_slugs=None, kinds=('popolo', 'csv'),
+                 max_workers=DEFAULT_PREFETCH_WORKERS, progress=None):
+        """Download and cache data for many legislatures concurrently
+
+        This loads the Popolo JSON of every legislature (if 'popolo' is
+        in kinds) and the CSV of every legislative period (if 'csv' is
+        in kinds) in the countries with the given slugs, or in all
+        countries if country_slugs is None, using a pool of max_workers
+        threads.  The results are kept in popolo_cache (so with a limit on
+        its size, some may be dropped again) and LegislativePeriod.cached_csv.
+
+        If progress is given, it's called as progress(obj, kind, error)
+        after each item is finished, where error is None on success.
+        A failure doesn't stop the other items being loaded; instead it
+        is returned in the errors of the PrefetchResult."""
+        items = []
+        for country in self._countries_for(country_slugs):
+            for legislature in country.legislatures():
+                if 'popolo' in kinds:
+                    items.append((legislature, 'popolo'))
+                if 'csv' in kinds:
+                    items.extend(
+                        (lp, 'csv') for lp in legislature.legislative_periods())
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        result = PrefetchResult([], [])
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(getattr(obj, kind)): (obj, kind)
+                for obj, kind in items
+            }
+            for future in as_completed(futures):
+                obj, kind = futures[future]
+                error = future.exception()
+                if error is None:
+                    result.loaded.append((obj, kind))
+                else:
+                    result.errors.append((obj, kind, error))
+                if progress is not None:
+                    progress(obj, kind, error)
+        return result
+
+    def preload(self, country_slugs=None, kinds=(),
+                max_workers=DEFAULT_PREFETCH_WORKERS, freeze=False):
+        """Load and index countries.json once, e.g. before forking workers
+
+        With lazy data, only its flat index is built unless country_slugs
+        is given; kinds are prefetched, and freeze calls freeze_objects()."""
+        data = self.countries_json_data()
+        if country_slugs is not None or \
+                not isinstance(data, LazyCountriesData):
+            self._preload_countries(
+                self._countries_for(country_slugs), country_slugs is None)
+        result = PrefetchResult([], [])
+        if kinds:
+            result = self.prefetch(
+                country_slugs, kinds=kinds, max_workers=max_workers)
+        # Forked workers mustn't share the session's open connections:
+        self._close_owned_session()
+        if freeze:
+            freeze_objects()
+        return result
+
+    def _preload_countries(self, countries, all_countries):
+        for country in countries:
+            for legislature in country.legislatures():
+                legislature.lastmod
+                legislature.directory()
+                legislature.latest_legislative_period()
+        if all_countries:
+            self._periods_index()
+
+    def load_popolo_many(self, legislatures, processes=None, transform=None,
+                         max_workers=DEFAULT_PREFETCH_WORKERS):
+        """Load the Popolo data of many legislatures on a pool of processes
+
+        Parsing JSON is CPU-bound, so while the files are downloaded on
+        a pool of max_workers threads, they're parsed on a pool of
+        processes (by default, one per CPU).  This returns a list with
+        the Popolo object for each legislature, in the same order, and
+        the Popolo objects are kept in popolo_cache too.
+
+        If transform is given, it's called in the worker process with
+        the parsed JSON data of each legislature, and the list of its
+        return values is returned instead.  This makes it possible to
+        build something compact, like the entries of a search index,
+        in parallel without sending all the data back to this process.
+        transform must be picklable, so it should be a function defined
+        at the top level of a module, and so should its return value."""
+        from concurrent.futures import (
+            ProcessPoolExecutor, ThreadPoolExecutor, as_completed)
+        from popolo_data.importer import Popolo
+        legislatures = list(legislatures)
+        results = [None] * len(legislatures)
+        to_load = []
+        for i, legislature in enumerate(legislatures):
+            popolo = None if transform else legislature.cached_popolo
+            if popolo is None:
+                to_load.append(i)
+            else:
+                results[i] = popolo
+        if not to_load:
+            return results
+        with ThreadPoolExecutor(max_workers=max_workers) as fetchers, \
+                ProcessPoolExecutor(max_workers=processes) as parsers:
+            downloads = {
+                fetchers.submit(legislatures[i]._timed_popolo_bytes): i
+                for i in to_load
+            }
+            parses = {}
+            for future in as_completed(downloads):
+                i = downloads[future]
+                data = future.result()
+                if transform is None:
+                    parse = parsers.submit(parse_popolo_json, data)
+                else:
+                    parse = parsers.submit(
+                        transform_popolo_json, transform, data)
+                parses[parse] = (i, len(data))
+            for future in as_completed(parses):
+                i, size = parses[future]
+                if transform is not None:
+                    results[i] = future.result()
+                    continue
+                popolo = Popolo(marshal.loads(future.result()))
+                self.popolo_cache.put(
+                    legislatures[i]._popolo_cache_key(), popolo, size)
+                results[i] = popolo
+        return results
+
     def __repr__(self):
         if self.countries_json_filename is None:
             if self.countries_json_url == DEFAULT_COUNTRIES_JSON_URL:
@@ -87,32 +795,69 @@ class EveryPolitician(object):
             self.countries_json_url or self.countries_json_filename)
 
 
-@six.python_2_unicode_compatible
+@python_2_unicode_compatible
 class Country(object):
     """A class that represents a country from the countries.json file"""
 
-    def __init__(self, country_data):
-        for k in ('name', 'code', 'slug'):
-            setattr(self, k, country_data[k])
+    __slots__ = (
+        'name', 'code', 'slug', 'country_data', 'ep', '_legislatures',
+        '_legislatures_by_slug')
+
+    def __init__(self, country_data, ep=None):
+        self.name = country_data['name']
+        self.code = country_data['code']
+        self.slug = country_data['slug']
+        self.country_data = country_data
+        if ep is None:
+            ep = EveryPolitician()
+        self.ep = ep
+        self._legislatures = None
+        self._legislatures_by_slug = None
+
+    def _legislature_index(self):
+        """Build (once) the list of Legislature objects and the slug index"""
+        if self._legislatures is None:
+            legislatures = [
+                self._make_legislature(legislature_data) for legislature_data
+                in self.country_data['legislatures']
+            ]
+            by_slug = {}
+            for l in legislatures:
+                by_slug.setdefault(l.slug, l)
+            self._legislatures = legislatures
+            self._legislatures_by_slug = by_slug
+        return self._legislatures, self._legislatures_by_slug
+
+    def _make_legislature(self, legislature_data):
+        return Legislature(legislature_data, self)
+
+    def _set_data(self, country_data, legislatures):
+        """Replace this country's data and its list of Legislature objects"""
+        self.name = country_data['name']
+        self.code = country_data['code']
+        self.slug = country_data['slug']
         self.country_data = country_data
+        by_slug = {}
+        for l in legislatures:
+            by_slug.setdefault(l.slug, l)
+        self._legislatures = legislatures
+        self._legislatures_by_slug = by_slug
 
     def legislatures(self):
         """Return all the legislatures known for this country
 
         A legislature is a chamber of a parliament, e.g. the House of
         Commons in the UK."""
-        return [
-            Legislature(legislature_data, self) for legislature_data
-            in self.country_data['legislatures']
-        ]
+        return list(self._legislature_index()[0])
 
     def legislature(self, legislature_slug):
         """Return a legislature in this country from its slug"""
-        for l in self.legislatures():
-            if l.slug == legislature_slug:
-                return l
-        raise NotFound("Couldn't find the legislature with slug '{0}'".format(
-            legislature_slug))
+        try:
+            return self._legislature_index()[1][legislature_slug]
+        except KeyError:
+            raise NotFound(
+                "Couldn't find the legislature with slug '{0}'".format(
+                    legislature_slug))
 
     def houses(self, type_of_house):
         return [
@@ -125,9 +870,14 @@ class Country(object):
             raise NotFound("No house of type {0}".format(type_of_house))
         if len(houses) == 1:
             return houses[0]
-        return max(
-            houses,
-            key=lambda h: h.latest_legislative_period().start_date)
+        return max(houses, key=latest_start_date)
+
+    def houses_active_on(self, date):
+        """Return the legislatures that had a legislative period on date
+
+        date can be a datetime.date or an ISO 8601 date."""
+        return [
+            l for l in self.legislatures() if l.period_on(date) is not None]
 
     def lower_house(self):
         """A shortcut method to return the most recently active lower house"""
@@ -147,42 +897,192 @@ class Country(object):
         return '<Country: {0}>'.format(self.name)
 
 
-@six.python_2_unicode_compatible
+@python_2_unicode_compatible
 class Legislature(object):
     """A class that represents a legislature of a country"""
 
+    __slots__ = (
+        'name', 'slug', 'person_count', 'sha', 'statement_count',
+        'popolo_url', 'type', 'legislature_data', 'country', '_lastmod',
+        '_directory', '_legislative_periods', '_period_index',
+        '_latest_legislative_period', '_people_shard')
+
     def __init__(self, legislature_data, country):
-        for k in ('name', 'slug', 'person_count', 'sha', 'statement_count',
-                  'popolo_url', 'type'):
-            setattr(self, k, legislature_data[k])
-        self.lastmod = datetime.utcfromtimestamp(
-            float(legislature_data['lastmod']))
+        self.name = legislature_data['name']
+        self.slug = legislature_data['slug']
+        self.person_count = legislature_data['person_count']
+        self.sha = legislature_data['sha']
+        self.statement_count = legislature_data['statement_count']
+        self.popolo_url = legislature_data['popolo_url']
+        self.type = legislature_data['type']
         self.legislature_data = legislature_data
         self.country = country
-        self.cached_popolo = None
+        self._lastmod = None
+        self._directory = None
+        self._legislative_periods = None
+        self._period_index = None
+        self._latest_legislative_period = None
+        self._people_shard = None
+
+    @property
+    def lastmod(self):
+        """Return when the legislature's data was last modified, as a datetime"""
+        if self._lastmod is None:
+            self._lastmod = datetime.utcfromtimestamp(
+                float(self.legislature_data['lastmod']))
+        return self._lastmod
+
+    @property
+    def popolo_path(self):
+        """Return the path of the Popolo JSON in everypolitician-data"""
+        popolo_path = self.legislature_data.get('popolo')
+        if popolo_path is None:
+            sources_directory = self.legislature_data['sources_directory']
+            popolo_path = sources_directory.rsplit('/', 1)[0] + \
+                '/ep-popolo-v1.0.json'
+        return popolo_path
+
+    def _popolo_cache_key(self):
+        return '{0}/{1}'.format(self.sha, self.popolo_path)
+
+    def _popolo_from_bytes(self, data):
+        from popolo_data.importer import Popolo
+        return Popolo(json.loads(data.decode('utf-8')))
+
+    @property
+    def cached_popolo(self):
+        """Return the Popolo data if it's loaded and cached, or None"""
+        return self.country.ep.popolo_cache.get(self._popolo_cache_key())
+
+    @cached_popolo.setter
+    def cached_popolo(self, popolo):
+        if popolo is None:
+            self.country.ep.popolo_cache.discard(self._popolo_cache_key())
+        else:
+            self.country.ep.popolo_cache.put(self._popolo_cache_key(), popolo)
 
     def popolo(self):
-        if self.cached_popolo is None:
-            self.cached_popolo = Popolo.from_url(self.popolo_url)
-        return self.cached_popolo
+        """Return the legislature's Popolo data
+
+        This is cached by the EveryPolitician object under the
+        legislature's sha, and however many threads ask for it at once,
+        it's only loaded once."""
+        return self.country.ep.popolo_cache.get_or_load(
+            self._popolo_cache_key(), self._load_popolo)
+
+    def _load_popolo(self):
+        with self._popolo_timer() as timer:
+            data = timer.downloaded(self._popolo_bytes(timer))
+            popolo = self._popolo_from_bytes(data)
+        return popolo, len(data)
+
+    def _popolo_timer(self):
+        return self.country.ep.instrumentation.timer(
+            'popolo', self.popolo_url, legislature=self)
+
+    def _popolo_bytes(self, timer=NO_TIMER):
+        return self.country.ep._fetch(
+            self.popolo_url, cache_key=self._popolo_cache_key(),
+            path=self.popolo_path, timer=timer)
+
+    def _timed_popolo_bytes(self):
+        """Return the Popolo JSON bytes, reporting the fetch but not parsing"""
+        with self._popolo_timer() as timer:
+            return timer.downloaded(self._popolo_bytes(timer))
+
+    def _people_shard_cache_key(self):
+        return '{0}/{1}/people-index-v1.json'.format(
+            self.sha, self.directory())
+
+    def _cached_people_shard(self):
+        cache = self.country.ep.cache
+        if cache is None:
+            return None
+        data = cache.get(self._people_shard_cache_key())
+        if data is None:
+            return None
+        return json.loads(data.decode('utf-8'))
+
+    def _store_people_shard(self, shard):
+        cache = self.country.ep.cache
+        if cache is not None:
+            cache.put(self._people_shard_cache_key(), json_bytes(shard))
+
+    def _load_people_shard(self):
+        if self._people_shard is None:
+            shard = self._cached_people_shard()
+            if shard is None:
+                shard = people_shard(
+                    self.popolo().json_data,
+                    [(lp.id, lp.iter_csv())
+                     for lp in self.legislative_periods()])
+                self._store_people_shard(shard)
+            self._people_shard = shard
+        return self._people_shard
 
     def directory(self):
         """Return the directory path in the everypolitician-data repository"""
-        split_path = self.legislature_data['sources_directory'].split('/')
-        return '/'.join(split_path[1:3])
+        if self._directory is None:
+            split_path = self.legislature_data['sources_directory'].split('/')
+            self._directory = '/'.join(split_path[1:3])
+        return self._directory
 
     def legislative_periods(self):
         """Return all the known legislative periods for this legislature"""
-        return [
-            LegislativePeriod(lp_data, self, self.country)
-            for lp_data in self.legislature_data['legislative_periods']
-        ]
+        if self._legislative_periods is None:
+            self._legislative_periods = [
+                self._make_legislative_period(lp_data)
+                for lp_data in self.legislature_data['legislative_periods']
+            ]
+        return list(self._legislative_periods)
+
+    def _make_legislative_period(self, legislative_period_data):
+        return LegislativePeriod(
+            legislative_period_data, self, self.country)
 
     def latest_legislative_period(self):
-        """Return the most recent legislative period for this legislature"""
-        return max(
+        """Return the most recent legislative period for this legislature
+
+        This is the one that started latest.  If none of the periods
+        has a known start date, the last one listed is returned, and if
+        there are no periods at all, this returns None."""
+        if self._latest_legislative_period is None:
+            latest = self._periods_index().last()
+            if latest is None and self.legislature_data['legislative_periods']:
+                latest = self.legislative_periods()[-1]
+            self._latest_legislative_period = latest
+        return self._latest_legislative_period
+
+    def period_on(self, date):
+        """Return the legislative period that was going on at date
+
+        date can be a datetime.date or an ISO 8601 date.  If more than
+        one period includes that date, the one that started latest is
+        returned.  If none do, this returns None."""
+        periods = self._periods_index().containing(parse_date(date))
+        if not periods:
+            return None
+        return periods[-1]
+
+    def _periods_index(self):
+        if self._period_index is None:
+            self._period_index = IntervalIndex(
+                period_interval(lp) for lp in self.legislative_periods())
+        return self._period_index
+
+    def turnover(self):
+        """Return a PeriodDiff for each pair of consecutive periods
+
+        The legislative periods are taken in order of their start date
+        (those without one first), and the CSV file of each is only
+        read once, as it's streamed."""
+        periods = self._periods_by_start_date()
+        return consecutive_diffs(periods, (lp._members() for lp in periods))
+
+    def _periods_by_start_date(self):
+        return sorted(
             self.legislative_periods(),
-            key=lambda lp: lp.start_date)
+            key=lambda lp: period_interval(lp)[0] or date.min)
 
     def __repr__(self):
         fmt = str('<Legislature: {0} in {1}>')
@@ -196,6 +1096,39 @@ class Legislature(object):
             .format(self.name, self.country.name)
 
 
+def freeze_objects():
+    """Stop the garbage collector touching any of the existing objects
+
+    Forked processes then share the memory of those objects for longer,
+    as collections in them don't write to it.  This does nothing before
+    Python 3.7, which doesn't have gc.freeze()."""
+    freeze = getattr(gc, 'freeze', None)
+    if freeze is not None:
+        freeze()
+
+
+def latest_start_date(legislature):
+    latest = legislature.latest_legislative_period()
+    if latest is None:
+        return date.min
+    return period_interval(latest)[0] or date.min
+
+
+def period_interval(legislative_period):
+    """Return a (start, end, legislative_period) tuple for an IntervalIndex
+
+    A start or end date that can't be parsed is treated as unknown."""
+    try:
+        start = parse_date(legislative_period.start_date)
+    except ValueError:
+        start = None
+    try:
+        end = parse_date(legislative_period.end_date, end=True)
+    except ValueError:
+        end = None
+    return start, end, legislative_period
+
+
 def unicode_dict(d):
     """Return a new dict where all the text has been decoded to unicode
 
@@ -205,12 +1138,19 @@ def unicode_dict(d):
 
 class LegislativePeriod(object):
 
+    __slots__ = (
+        'id', 'name', 'slug', 'legislative_period_data', 'legislature',
+        'country', 'cached_csv', '_csv_fieldnames')
+
     def __init__(self, legislative_period_data, legislature, country):
-        for k in ('id', 'name', 'slug'):
-            setattr(self, k, legislative_period_data[k])
+        self.id = legislative_period_data['id']
+        self.name = legislative_period_data['name']
+        self.slug = legislative_period_data['slug']
         self.legislature = legislature
         self.country = country
         self.legislative_period_data = legislative_period_data
+        self.cached_csv = None
+        self._csv_fieldnames = None
 
     @property
     def start_date(self):
@@ -229,26 +1169,106 @@ class LegislativePeriod(object):
     @property
     def csv_url(self):
         """Return the URL to CSV of members during this legislative period"""
-        return 'https://raw.githubusercontent.com/everypolitician' \
-            '/everypolitician-data/{0}/{1}'.format(
-                self.legislature.sha,
-                self.legislative_period_data['csv']
-            )
+        return '{0}/{1}/{2}'.format(
+            self.country.ep.data_base_url,
+            self.legislature.sha,
+            self.legislative_period_data['csv']
+        )
 
-    def csv(self):
+    def csv(self, row_type='dict', columns=None, where=None):
         """Return parsed data from the CSV of members during the period
 
-        This returns a list of one dict per row of the CSV file, where
-        the keys are the column headers."""
-        r = requests.get(self.csv_url)
-        r.raise_for_status()
-        if six.PY2:
-            f = io.BytesIO(r.text.encode('utf-8'))
-            reader = csv.DictReader(f)
-            return [
-                unicode_dict(d) for d in reader
-            ]
-        else:
-            f = io.StringIO(r.text)
-            reader = csv.DictReader(f)
-            return [d for d in reader]
+        By default this returns a list of one dict per row of the CSV
+        file, where the keys are the column headers.  The CSV file is
+        only fetched and parsed once in that case.
+
+        More compact representations are available with row_type:
+        'tuple' returns a list of namedtuples, with one class for each
+        distinct header (see row_class), and 'columnar' returns an
+        OrderedDict mapping each column header to the list of values in
+        that column, with repeated values shared.
+
+        If columns is given, only those columns are included in each
+        row, and if where is given, only the rows that match it are
+        included, as described in select_records; e.g.:
+
+            lp.csv(columns=['id', 'name'], where={'group': 'Labour'})
+
+        These are applied as the CSV is parsed, so rows and columns
+        that aren't wanted are never built, and the result isn't kept."""
+        if columns is None and where is None and row_type == 'dict':
+            if self.cached_csv is None:
+                self.cached_csv = list(self.iter_csv())
+            return self.cached_csv
+        records = select_records(self._iter_csv_records(), columns, where)
+        if row_type == 'columnar':
+            return columns_from_records(records)
+        return list(rows_from_records(records, row_type))
+
+    def iter_csv(self, row_type='dict', columns=None, where=None):
+        """Yield one row at a time from the CSV of members during the period
+
+        Unlike csv(), this doesn't keep the rows: the CSV file is
+        streamed and each row is parsed as it arrives, so only one row
+        needs to be held in memory at a time.  If the rows have already
+        been loaded by csv(), they're used instead.  row_type, columns
+        and where are as for csv(), except that row_type can't be
+        'columnar'."""
+        records = self._iter_csv_records()
+        if columns is not None or where is not None:
+            records = select_records(records, columns, where)
+        return rows_from_records(records, row_type)
+
+    def _iter_csv_records(self):
+        """Yield the header and then each row of the CSV as a list of text"""
+        if self.cached_csv is not None and self._csv_fieldnames is not None:
+            fieldnames = self._csv_fieldnames
+            yield fieldnames
+            for row in self.cached_csv:
+                yield [row[k] for k in fieldnames]
+            return
+        with self._csv_timer() as timer:
+            chunks = self.country.ep._fetch_chunks(
+                self.csv_url, cache_key=self._csv_cache_key(),
+                path=self.legislative_period_data['csv'], timer=timer)
+            records = iter_records(iter_lines(timer.timed_chunks(chunks)))
+            for record in self._keeping_fieldnames(records):
+                yield record
+
+    def _keeping_fieldnames(self, records):
+        """Pass records through, keeping the header as _csv_fieldnames"""
+        records = iter(records)
+        for record in records:
+            self._csv_fieldnames = record
+            yield record
+            break
+        for record in records:
+            yield record
+
+    def _csv_timer(self):
+        return self.country.ep.instrumentation.timer(
+            'csv', self.csv_url, legislature=self.legislature,
+            legislative_period=self)
+
+    def diff(self, other):
+        """Return a PeriodDiff of the changes from this period to other
+
+        For example, joined is the ids of people who were members in
+        other but not this period."""
+        return diff_members(self, other, self._members(), other._members())
+
+    def _members(self):
+        return period_members(self._iter_csv_records())
+
+    def _csv_cache_key(self):
+        return '{0}/{1}'.format(
+            self.legislature.sha, self.legislative_period_data['csv'])
+
+    def _rows_from_bytes(self, data, row_type='dict', columns=None,
+                         where=None):
+        records = self._keeping_fieldnames(iter_records(iter_lines([data])))
+        if columns is not None or where is not None:
+            records = select_records(records, columns, where)
+        if row_type == 'columnar':
+            return columns_from_records(records)
+        return list(rows_from_records(records, row_type))
@@ -0,0 +1,110 @@
+"""An index of people across all legislatures
+
+The index is built from one shard per legislature, made from its Popolo
+data and legislative period CSV files.  A shard only depends on the
+legislature's data, so it's stored under the legislature's sha and only
+needs to be rebuilt when that changes.
+"""
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict, defaultdict, namedtuple
+import unicodedata
+
+
+Membership = namedtuple(
+    'Membership', ['person_id', 'country', 'legislature', 'legislative_period'])
+
+
+def normalize_name(name):
+    """Return name in lower case, without accents and extra whitespace
+
+    For example, 'Adrián  PÉREZ' and 'adrian perez' both become
+    'adrian perez'."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.lower().split())
+
+
+def people_shard(popolo_json_data, period_rows):
+    """Build the shard of the index for one legislature
+
+    popolo_json_data is the legislature's parsed Popolo JSON, and
+    period_rows is an iterable of (legislative period id, rows) pairs,
+    where the rows are dicts from that period's CSV file.  The shard
+    is a dict that can be serialized as JSON."""
+    people = OrderedDict()
+
+    def person(person_id, name):
+        entry = people.get(person_id)
+        if entry is None:
+            entry = people[person_id] = {
+                'id': person_id,
+                'name': name,
+                'names': [],
+                'identifiers': [],
+                'periods': [],
+            }
+        if name and normalize_name(name) not in entry['names']:
+            entry['names'].append(normalize_name(name))
+        return entry
+
+    for person_data in popolo_json_data.get('persons', []):
+        entry = person(person_data['id'], person_data.get('name'))
+        for other_name in person_data.get('other_names', []):
+            normalized = normalize_name(other_name['name'])
+            if normalized not in entry['names']:
+                entry['names'].append(normalized)
+        for identifier in person_data.get('identifiers', []):
+            entry['identifiers'].append(
+                [identifier['scheme'], identifier['identifier']])
+    for period_id, rows in period_rows:
+        for row in rows:
+            entry = person(row['id'], row.get('name'))
+            if period_id not in entry['periods']:
+                entry['periods'].append(period_id)
+    return {'people': list(people.values())}
+
+
+class PeopleIndex(object):
+    """Find the memberships of people by id, name or other identifier
+
+    Each lookup returns a list of Membership tuples, giving the person's
+    id and the Country, Legislature and LegislativePeriod objects for
+    each legislative period they were a member in."""
+
+    def __init__(self):
+        self._by_id = defaultdict(list)
+        self._by_name = defaultdict(list)
+        self._by_identifier = defaultdict(list)
+
+    def add(self, legislature, shard):
+        """Add the shard built from legislature's data to the index"""
+        periods = dict(
+            (lp.id, lp) for lp in legislature.legislative_periods())
+        for entry in shard['people']:
+            memberships = [
+                Membership(
+                    entry['id'], legislature.country, legislature,
+                    periods[period_id])
+                for period_id in entry['periods'] if period_id in periods
+            ]
+            self._by_id[entry['id']].extend(memberships)
+            for name in entry['names']:
+                self._by_name[name].extend(memberships)
+            for scheme, identifier in entry['identifiers']:
+                self._by_identifier[scheme, identifier].extend(memberships)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def by_id(self, person_id):
+        return list(self._by_id.get(person_id, []))
+
+    def by_name(self, name):
+        """Return the memberships of everyone with name, ignoring accents
+        and case"""
+        return list(self._by_name.get(normalize_name(name), []))
+
+    def by_identifier(self, identifier, scheme='wikidata'):
+        return list(self._by_identifier.get((scheme, identifier), []))
@@ -0,0 +1,226 @@
+from __future__ import unicode_literals
+
+import codecs
+from collections import OrderedDict, namedtuple
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import io
+
+from .deferred import DeferredModule
+
+
+csv = DeferredModule('csv')
+six = DeferredModule('six')
+
+
+_row_classes = {}
+
+
+def iter_lines(chunks):
+    """Split an iterable of chunks of UTF-8 bytes into lines
+
+    On Python 3 the lines are decoded to text; on Python 2 they're left
+    as bytes for the csv module.  Only '\\n' is treated as a line
+    separator, and each line keeps its line ending, so the result can be
+    passed to csv.reader even if quoted fields contain newlines."""
+    if six.PY2:
+        def decode(chunk, final=False):
+            return chunk
+        newline = b'\n'
+        pending = b''
+    else:
+        decode = codecs.getincrementaldecoder('utf-8')().decode
+        newline = '\n'
+        pending = ''
+    for chunk in chunks:
+        lines = (pending + decode(chunk)).split(newline)
+        pending = lines.pop()
+        for line in lines:
+            yield line + newline
+    pending += decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(lines):
+    """Parse CSV lines into lists of text, skipping blank lines
+
+    The first list yielded is the header row."""
+    for record in csv.reader(lines):
+        if not record:
+            continue
+        if six.PY2:
+            record = [v.decode('utf-8') for v in record]
+        yield record
+
+
+def row_class(fieldnames):
+    """Return a namedtuple class for rows with the given column headers
+
+    The class is only created once for each distinct header, so all the
+    legislative periods whose CSV files have the same columns share it.
+    Column headers that aren't valid Python identifiers are renamed to
+    _0, _1, etc. (by position) in the attribute names."""
+    fieldnames = tuple(fieldnames)
+    cls = _row_classes.get(fieldnames)
+    if cls is None:
+        cls = namedtuple(
+            str('Row'), [str(f) for f in fieldnames] if six.PY2 else fieldnames,
+            rename=True)
+        _row_classes[fieldnames] = cls
+    return cls
+
+
+def rows_from_records(records, row_type='dict'):
+    """Yield rows built from the header and records from iter_records
+
+    If row_type is 'dict', each row is a dict whose keys are the column
+    headers, just as csv.DictReader would give.  If it's 'tuple', each
+    row is an instance of the namedtuple class from row_class."""
+    if row_type not in ('dict', 'tuple'):
+        raise ValueError('Unknown row type: {0}'.format(row_type))
+    records = iter(records)
+    try:
+        fieldnames = next(records)
+    except StopIteration:
+        return
+    n = len(fieldnames)
+    if row_type == 'tuple':
+        cls = row_class(fieldnames)
+        for record in records:
+            if len(record) != n:
+                record = (record + [None] * n)[:n]
+            yield cls._make(record)
+        return
+    for record in records:
+        d = dict(zip(fieldnames, record))
+        if len(record) > n:
+            d[None] = record[n:]
+        elif len(record) < n:
+            for k in fieldnames[len(record):]:
+                d[k] = None
+        yield d
+
+
+class RecordView(Mapping):
+    """A read-only mapping from column headers to the values of one record
+
+    select_records passes one of these to a where function instead of
+    building a dict for every row.  The same view is reused for each
+    record, so it shouldn't be kept after the function returns."""
+
+    __slots__ = ('_index', 'record')
+
+    def __init__(self, fieldnames):
+        self._index = dict((k, i) for i, k in enumerate(fieldnames))
+        self.record = None
+
+    def __getitem__(self, key):
+        i = self._index[key]
+        return self.record[i] if i < len(self.record) else None
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def _record_filter(fieldnames, where):
+    """Return a function that tells whether a record matches where"""
+    if callable(where):
+        view = RecordView(fieldnames)
+
+        def matches(record):
+            view.record = record
+            return where(view)
+        return matches
+    tests = []
+    for column, wanted in where.items():
+        if column not in fieldnames:
+            raise ValueError('Unknown column: {0}'.format(column))
+        if not isinstance(wanted, (set, frozenset, list, tuple)):
+            wanted = (wanted,)
+        tests.append((fieldnames.index(column), frozenset(wanted)))
+
+    def matches(record):
+        n = len(record)
+        for i, wanted in tests:
+            if (record[i] if i < n else None) not in wanted:
+                return False
+        return True
+    return matches
+
+
+def select_records(records, columns=None, where=None):
+    """Filter and project the header and records from iter_records
+
+    Only the records that match where are yielded, and each (including
+    the header) is cut down to the given columns, in the order given.
+    where can be a dict mapping column headers to the value wanted in
+    that column (or a set, list or tuple of acceptable values), or a
+    function that's passed a RecordView of each record and returns
+    whether to keep it.  If columns or where is None, all columns or
+    all records are kept."""
+    records = iter(records)
+    try:
+        fieldnames = next(records)
+    except StopIteration:
+        return
+    if where is not None:
+        records = six.moves.filter(_record_filter(fieldnames, where), records)
+    if columns is None:
+        yield fieldnames
+        for record in records:
+            yield record
+        return
+    for column in columns:
+        if column not in fieldnames:
+            raise ValueError('Unknown column: {0}'.format(column))
+    indexes = [fieldnames.index(column) for column in columns]
+    yield list(columns)
+    for record in records:
+        n = len(record)
+        yield [record[i] if i < n else None for i in indexes]
+
+
+def columns_from_records(records):
+    """Return an OrderedDict mapping each column header to a list of values
+
+    Repeated values in a column (like the group, area or gender of each
+    member) are all the same string object, rather than a separate copy
+    for each row."""
+    records = iter(records)
+    try:
+        fieldnames = next(records)
+    except StopIteration:
+        return OrderedDict()
+    n = len(fieldnames)
+    columns = [[] for _ in fieldnames]
+    interned = [{} for _ in fieldnames]
+    for record in records:
+        for i in range(n):
+            value = record[i] if i < len(record) else None
+            columns[i].append(interned[i].setdefault(value, value))
+    return OrderedDict(zip(fieldnames, columns))
+
+
+def csv_bytes(fieldnames, rows):
+    """Return UTF-8 encoded CSV for rows (dicts) with the given headers"""
+    if six.PY2:
+        def encode(v):
+            return v if v is None else v.encode('utf-8')
+        f = io.BytesIO()
+        writer = csv.writer(f, lineterminator=b'\n')
+        writer.writerow([encode(k) for k in fieldnames])
+        for row in rows:
+            writer.writerow([encode(row.get(k)) for k in fieldnames])
+        return f.getvalue()
+    f = io.StringIO()
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(fieldnames)
+    for row in rows:
+        writer.writerow([row.get(k) for k in fieldnames])
+    return f.getvalue().encode('utf-8')
@@ -0,0 +1,158 @@
+"""Single-file snapshots of EveryPolitician data
+
+A snapshot file holds the countries.json data together with any Popolo
+JSON and legislative period CSV files that had been loaded, so that it
+can be opened later without downloading or parsing anything up front.
+
+The file starts with MAGIC, then the length of a JSON header as an
+8-byte big-endian integer, then the header, then the sections.  Each
+section is compressed separately with zlib, and the header gives the
+offset and length of each: one section per country (so that each
+country can be decoded only when it's used), and one per data file,
+under the same key as in the on-disk cache.  The file is memory-mapped
+when it's opened, so sections that aren't used are never read.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from .lazy import LazyCountriesData
+from .rows import csv_bytes
+
+
+MAGIC = b'EPSNAP1\n'
+
+_HEADER_LENGTH = struct.Struct(str('>Q'))
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Snapshot(object):
+    """A memory-mapped snapshot file opened for reading"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix_length = len(MAGIC) + _HEADER_LENGTH.size
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(
+                '{0} is not an EveryPolitician snapshot'.format(filename))
+        header_length, = _HEADER_LENGTH.unpack(
+            self._mmap[len(MAGIC):prefix_length])
+        header = json.loads(
+            self._mmap[prefix_length:prefix_length + header_length]
+            .decode('utf-8'))
+        self.countries_json_url = header['countries_json_url']
+        self.countries = [tuple(c) for c in header['countries']]
+        self.files = dict(
+            (key, tuple(section)) for key, section in header['files'].items())
+
+    def read(self, offset, length):
+        return zlib.decompress(self._mmap[offset:offset + length])
+
+    def get(self, key):
+        """Return the bytes of the file stored under key, or None"""
+        section = self.files.get(key)
+        if section is None:
+            return None
+        return self.read(*section)
+
+    def countries_json_data(self):
+        return SnapshotCountriesData(self)
+
+    def close(self):
+        self._mmap.close()
+
+
+class SnapshotCountriesData(LazyCountriesData):
+    """The countries.json data from a Snapshot, decoded a country at a time"""
+
+    def __init__(self, snapshot):
+        self._data = None
+        self._snapshot = snapshot
+        self._set_countries(snapshot.countries)
+
+    def _load(self, offset, length):
+        return json.loads(self._snapshot.read(offset, length).decode('utf-8'))
+
+
+def write_snapshot(ep, filename):
+    """Write the data loaded by the EveryPolitician object ep to filename
+
+    The snapshot includes the Popolo JSON of each legislature whose
+    popolo() has been loaded and the CSV of each legislative period
+    whose csv() has been loaded, as well as all of countries.json.  If
+    ep was itself loaded from a snapshot, the files in that are kept."""
+    sections = []
+    countries = []
+    files = {}
+
+    def add(data):
+        sections.append(zlib.compress(data))
+        return len(sections) - 1
+
+    for country in ep._country_index()[0]:
+        countries.append((country.slug, add(json_bytes(country.country_data))))
+        for legislature in country.legislatures():
+            if legislature.cached_popolo is not None:
+                files[legislature._popolo_cache_key()] = add(
+                    json_bytes(legislature.cached_popolo.json_data))
+            for lp in legislature.legislative_periods():
+                if lp.cached_csv is not None and \
+                        lp._csv_fieldnames is not None:
+                    files[lp._csv_cache_key()] = add(
+                        csv_bytes(lp._csv_fieldnames, lp.cached_csv))
+    if ep._snapshot is not None:
+        for key in ep._snapshot.files:
+            if key not in files:
+                files[key] = add(ep._snapshot.get(key))
+
+    # Work out where each section will be, now that the size of the
+    # header is known:
+    def header_bytes(offsets):
+        return json_bytes({
+            'countries_json_url': ep.countries_json_url,
+            'countries': [
+                [slug, offsets[i], len(sections[i])] for slug, i in countries],
+            'files': dict(
+                (key, [offsets[i], len(sections[i])])
+                for key, i in files.items()),
+        })
+
+    # The offsets are fixed-width so that the header's length doesn't
+    # depend on them:
+    header_length = len(header_bytes([10 ** 15] * len(sections)))
+    offset = len(MAGIC) + _HEADER_LENGTH.size + header_length
+    offsets = []
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+    header = header_bytes(offsets)
+    header += b' ' * (header_length - len(header))
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(prefix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            for section in sections:
+                f.write(section)
+        getattr(os, 'replace', os.rename)(tmp_filename, filename)
+    except Exception:
+        os.remove(tmp_filename)
+        raise
+
+
+def json_bytes(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,139 @@
+"""Columnar tables of memberships from many legislative periods
+
+NumPy and pyarrow are optional: the tables are built with the standard
+library's array module, and can be converted if they're installed.
+"""
+
+from __future__ import unicode_literals
+
+from array import array
+from collections import OrderedDict
+
+
+TAG_COLUMNS = ('country_slug', 'legislature_slug', 'legislative_period_slug')
+
+
+class Categorical(object):
+    """A column of strings stored as integer codes into its categories
+
+    Each distinct value is stored once, in categories, and codes holds
+    the index of each row's value in that list, as an array of C ints.
+    A missing value (None) has the code -1."""
+
+    __slots__ = ('codes', 'categories', '_code_for')
+
+    def __init__(self, length=0):
+        self.codes = array(str('i'), [-1]) * length
+        self.categories = []
+        self._code_for = {None: -1}
+
+    def _code(self, value):
+        code = self._code_for.get(value)
+        if code is None:
+            code = self._code_for[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self._code(value))
+
+    def append_repeated(self, value, count):
+        self.codes.extend(array(str('i'), [self._code(value)]) * count)
+
+    def pad(self, length):
+        """Add missing values until the column is length rows long"""
+        if len(self.codes) < length:
+            self.append_repeated(None, length - len(self.codes))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code == -1 else self.categories[code]
+
+    def values(self):
+        """Return the list of values, with None where they're missing"""
+        categories = self.categories
+        return [
+            None if code == -1 else categories[code] for code in self.codes]
+
+
+class MembershipsTable(object):
+    """The rows of many legislative period CSV files in one table
+
+    Each CSV column becomes a Categorical, and there are also columns
+    named in TAG_COLUMNS giving the slugs of the country, legislature
+    and legislative period each row came from.  A column that's missing
+    from some periods' CSV files has missing values in their rows."""
+
+    def __init__(self):
+        self.columns = OrderedDict(
+            (name, Categorical()) for name in TAG_COLUMNS)
+        self._length = 0
+
+    def add(self, legislative_period, records):
+        """Add the header and records (from iter_records) of a period"""
+        records = iter(records)
+        try:
+            fieldnames = next(records)
+        except StopIteration:
+            return
+        columns = []
+        for name in fieldnames:
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = Categorical(self._length)
+            columns.append(column)
+        appends = [column.append for column in columns]
+        n = len(appends)
+        count = 0
+        for record in records:
+            if len(record) != n:
+                record = (record + [None] * n)[:n]
+            for append, value in zip(appends, record):
+                append(value)
+            count += 1
+        tags = (
+            legislative_period.country.slug,
+            legislative_period.legislature.slug,
+            legislative_period.slug,
+        )
+        for name, tag in zip(TAG_COLUMNS, tags):
+            self.columns[name].append_repeated(tag, count)
+        self._length += count
+        for column in self.columns.values():
+            column.pad(self._length)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def to_numpy(self):
+        """Return an OrderedDict mapping each column name to a tuple of
+        its codes and its categories, as NumPy arrays
+
+        The codes are an int32 array that shares memory with the table."""
+        import numpy
+        return OrderedDict(
+            (name, (numpy.frombuffer(column.codes, dtype=numpy.intc),
+                    numpy.array(column.categories, dtype=object)))
+            for name, column in self.columns.items())
+
+    def to_arrow(self):
+        """Return a pyarrow.Table with a dictionary-encoded column for
+        each column of the table"""
+        import numpy
+        import pyarrow
+        arrays = []
+        for column in self.columns.values():
+            codes = numpy.frombuffer(column.codes, dtype=numpy.intc)
+            indices = pyarrow.array(
+                codes, mask=codes == -1, type=pyarrow.int32())
+            dictionary = pyarrow.array(
+                column.categories, type=pyarrow.string())
+            arrays.append(
+                pyarrow.DictionaryArray.from_arrays(indices, dictionary))
+        return pyarrow.Table.from_arrays(arrays, names=list(self.columns))
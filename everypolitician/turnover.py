@@ -0,0 +1,90 @@
+"""Changes in membership between legislative periods
+
+Each period's CSV rows are reduced to a dict keyed by person id, and
+two periods are compared by looking up each id in the other's dict, so
+comparing periods takes time in proportion to their number of rows.
+"""
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict, namedtuple
+
+
+PeriodDiff = namedtuple('PeriodDiff', [
+    'old', 'new', 'joined', 'left', 'group_changes', 'area_changes'])
+PeriodDiff.__doc__ = """The changes from the old to the new legislative period
+
+joined and left are lists of the ids of the people who were members in
+new but not old, and in old but not new.  group_changes and
+area_changes are lists of (id, old value, new value) for the people who
+were members in both, but whose group or area at the end of the old
+period was different from their group or area at the start of the new
+one."""
+
+
+def period_members(records):
+    """Summarize the header and records from iter_records by person id
+
+    This returns an OrderedDict mapping each id to a list of the group
+    and area in that person's first row, and the group and area in
+    their last row.  Missing columns are treated as empty."""
+    records = iter(records)
+    try:
+        fieldnames = next(records)
+    except StopIteration:
+        return OrderedDict()
+    indexes = [
+        fieldnames.index(name) if name in fieldnames else None
+        for name in ('id', 'group', 'area')
+    ]
+    id_index, group_index, area_index = indexes
+    if id_index is None:
+        raise ValueError('There is no id column')
+    members = OrderedDict()
+    for record in records:
+        n = len(record)
+        group = record[group_index] \
+            if group_index is not None and group_index < n else None
+        area = record[area_index] \
+            if area_index is not None and area_index < n else None
+        member = members.get(record[id_index])
+        if member is None:
+            members[record[id_index]] = [group, area, group, area]
+        else:
+            member[2] = group
+            member[3] = area
+    return members
+
+
+def diff_members(old, new, old_members, new_members):
+    """Return a PeriodDiff for two results of period_members"""
+    joined = []
+    group_changes = []
+    area_changes = []
+    for person_id, new_member in new_members.items():
+        old_member = old_members.get(person_id)
+        if old_member is None:
+            joined.append(person_id)
+            continue
+        if old_member[2] != new_member[0]:
+            group_changes.append((person_id, old_member[2], new_member[0]))
+        if old_member[3] != new_member[1]:
+            area_changes.append((person_id, old_member[3], new_member[1]))
+    left = [
+        person_id for person_id in old_members if person_id not in new_members]
+    return PeriodDiff(old, new, joined, left, group_changes, area_changes)
+
+
+def consecutive_diffs(periods, members):
+    """Return a PeriodDiff for each pair of consecutive periods
+
+    members is an iterable of the results of period_members for each
+    of the periods, in the same order.  If it's a generator, only two
+    of them are kept at once."""
+    diffs = []
+    old = old_members = None
+    for new, new_members in zip(periods, members):
+        if old is not None:
+            diffs.append(diff_members(old, new, old_members, new_members))
+        old, old_members = new, new_members
+    return diffs
@@ -7,7 +7,7 @@ with open(join(dirname(__file__), 'README.rst')) as f:
 setup(
     name = "everypolitician",
     version = "0.0.13",
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
     author = "Mark Longair",
     author_email = "mark@mysociety.org",
     description = "Navigate countries and legislatures from EveryPolitician",
@@ -18,5 +18,11 @@ setup(
         'requests',
         'six >= 1.9.0',
         'everypolitician-popolo >= 0.0.11',
-    ]
+        'futures; python_version < "3"',
+    ],
+    extras_require = {
+        'async': ['aiohttp >= 3.3'],
+        'numpy': ['numpy'],
+        'arrow': ['numpy', 'pyarrow'],
+    },
 )
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import dirname, join
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from everypolitician import EveryPolitician
+from everypolitician.aio import (
+    AsyncEveryPolitician, AsyncLegislature, AsyncLegislativePeriod)
+
+
+ORIGINAL_BASE_URL = \
+    'https://cdn.rawgit.com/everypolitician/everypolitician-data'
+
+DIPUTADOS_SHA = 'd3afadff7d5a08e1745b7e48782a869ec4979e78'
+
+PATH_DATA = {
+    '/master/countries.json': 'example-countries.json',
+    '/{0}/data/Argentina/Diputados/term-133.csv'.format(DIPUTADOS_SHA):
+    'example-period.csv',
+    '/{0}/data/Argentina/Diputados/ep-popolo-v1.0.json'.format(DIPUTADOS_SHA):
+    'example-popolo.json',
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serve the test data as if this were raw.githubusercontent.com"""
+
+    def do_GET(self):
+        self.server.requested_paths.append(self.path)
+        leafname = PATH_DATA.get(self.path)
+        if leafname is None:
+            self.send_error(404)
+            return
+        with open(join(dirname(__file__), 'test-data', leafname), 'rb') as f:
+            data = f.read()
+        if leafname.endswith('countries.json'):
+            # Point the Popolo URLs at this server too:
+            data = data.replace(
+                ORIGINAL_BASE_URL.encode('utf-8'),
+                self.server.base_url.encode('utf-8'))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncEveryPolitician(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.base_url = 'http://127.0.0.1:{0}'.format(
+            self.server.server_address[1])
+        self.server.requested_paths = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def make_ep(self):
+        return AsyncEveryPolitician(
+            countries_json_url=self.server.base_url + '/master/countries.json',
+            data_base_url=self.server.base_url,
+            concurrency=2)
+
+    def test_country_legislature(self):
+        async def go():
+            async with self.make_ep() as ep:
+                return await ep.country_legislature('Argentina', 'Diputados')
+        country, legislature = self.run_async(go())
+        assert country.name == 'Argentina'
+        assert isinstance(legislature, AsyncLegislature)
+        assert legislature.name == 'Cámara de Diputados'
+
+    def test_periods_overlapping(self):
+        async def go():
+            async with self.make_ep() as ep:
+                return await ep.periods_overlapping('1990', '1994')
+        periods = self.run_async(go())
+        assert [(p.legislature.slug, p.slug) for p in periods] == \
+            [('Council', '1986'), ('Council', '1990')]
+
+    def test_popolo_and_csv(self):
+        async def go():
+            async with self.make_ep() as ep:
+                _, legislature = await ep.country_legislature(
+                    'Argentina', 'Diputados')
+                period = legislature.legislative_periods()[0]
+                popolo, rows = await asyncio.gather(
+                    legislature.popolo(), period.csv())
+                await legislature.popolo()
+                return period, popolo, rows
+        period, popolo, rows = self.run_async(go())
+        assert isinstance(period, AsyncLegislativePeriod)
+        assert popolo.persons.first.name == 'ADELA ROSA SEGARRA'
+        assert [r['name'] for r in rows] == ['ADELA ROSA SEGARRA', 'ADRIAN PEREZ']
+        assert len(self.server.requested_paths) == 3
+
+    def test_iter_csv_points_to_csv(self):
+        async def go():
+            async with self.make_ep() as ep:
+                _, legislature = await ep.country_legislature(
+                    'Argentina', 'Diputados')
+                return legislature.legislative_periods()[0]
+        period = self.run_async(go())
+        with pytest.raises(TypeError) as excinfo:
+            period.iter_csv()
+        assert 'await csv()' in str(excinfo.value)
+        assert len(self.server.requested_paths) == 1
+
+    def test_save_snapshot_includes_csv(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = join(directory, 'ep.snapshot')
+
+            async def go():
+                async with self.make_ep() as ep:
+                    _, legislature = await ep.country_legislature(
+                        'Argentina', 'Diputados')
+                    rows = await legislature.legislative_periods()[0].csv()
+                    ep.save_snapshot(filename)
+                    return rows
+            rows = self.run_async(go())
+            snapshot_ep = EveryPolitician.from_snapshot(filename)
+            period = snapshot_ep.country('Argentina') \
+                .legislature('Diputados').legislative_periods()[0]
+            assert period.csv() == rows
+            assert len(self.server.requested_paths) == 2
+        finally:
+            shutil.rmtree(directory)
+
+    def test_instrumentation(self):
+        async def go():
+            async with self.make_ep() as ep:
+                events = []
+                ep.instrumentation.add_hook(events.append)
+                _, legislature = await ep.country_legislature(
+                    'Argentina', 'Diputados')
+                await legislature.popolo()
+                await legislature.legislative_periods()[0].csv()
+                return events
+        events = self.run_async(go())
+        assert [(e.kind, e.source) for e in events] == [
+            ('countries_json', 'network'), ('popolo', 'network'),
+            ('csv', 'network')]
+        assert all(e.bytes > 0 for e in events)
+
+    def test_load_popolo_many(self):
+        async def go():
+            async with self.make_ep() as ep:
+                _, legislature = await ep.country_legislature(
+                    'Argentina', 'Diputados')
+                popolos = await ep.load_popolo_many([legislature], processes=1)
+                return legislature, popolos
+        legislature, popolos = self.run_async(go())
+        assert popolos[0].persons.first.name == 'ADELA ROSA SEGARRA'
+        assert legislature.cached_popolo is popolos[0]
+
+    def test_preload_closes_session(self):
+        async def go():
+            ep = self.make_ep()
+            result = await ep.preload()
+            return ep, result
+        ep, result = self.run_async(go())
+        assert result.loaded == []
+        legislature = ep._countries_by_slug['Argentina'] \
+            .legislature('Diputados')
+        assert legislature._period_index is not None
+        assert ep._period_index is not None
+        assert ep._session is None
+
+    def test_preload_countries(self):
+        async def go():
+            ep = self.make_ep()
+            await ep.preload(country_slugs=['Argentina'])
+            return ep
+        ep = self.run_async(go())
+        assert ep._countries_by_slug['Argentina'] \
+            .legislature('Senado')._period_index is not None
+        assert ep._period_index is None
+
+    def test_prefetch_collects_errors(self):
+        async def go():
+            async with self.make_ep() as ep:
+                return await ep.prefetch(country_slugs=['Argentina'])
+        result = self.run_async(go())
+        assert len(result.loaded) == 2
+        assert len(result.errors) == 2
+        for obj, kind, error in result.errors:
+            assert isinstance(error, aiohttp.ClientResponseError)
+            assert error.status == 404
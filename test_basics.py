@@ -2,59 +2,84 @@
 
 from __future__ import unicode_literals
 
+from array import array
+from datetime import date, datetime
 import json
+import os
 from os.path import dirname, join
 import re
+import shutil
+import tempfile
+import threading
 from unittest import TestCase
 
-from mock import patch
+from mock import MagicMock, patch
 import pytest
 import six
 from six import text_type
 
-from everypolitician import EveryPolitician, NotFound
+from everypolitician import (
+    DEFAULT_TIMEOUT, EveryPolitician, Legislature, NotFound, make_session)
+from everypolitician.lazy import scan_countries_json
+from everypolitician.snapshot import SnapshotError
 from popolo_data.importer import Popolo
 
 
 class FakeResponse(object):
 
-    def __init__(self, json_data, text, status_code):
-        self.json_data = json_data
-        self.text = text
+    def __init__(self, content, status_code, headers=None):
+        self.content = content
         self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
 
     def json(self):
-        return self.json_data
+        return json.loads(self.text)
 
-    def text(self):
-        return self.text
+    def iter_content(self, chunk_size=1):
+        # Use tiny chunks, so that multibyte characters and rows are
+        # split between chunks:
+        for i in range(0, len(self.content), 5):
+            yield self.content[i:i + 5]
 
     def raise_for_status(self):
         pass
 
+    def close(self):
+        pass
+
 
 URL_DATA = {
     'https://raw.githubusercontent.com/everypolitician/everypolitician-data/master/countries.json':
     'example-countries.json',
     'https://raw.githubusercontent.com/everypolitician/everypolitician-data/d3afadff7d5a08e1745b7e48782a869ec4979e78/data/Argentina/Diputados/term-133.csv':
-    'example-period.csv'
+    'example-period.csv',
+    'https://cdn.rawgit.com/everypolitician/everypolitician-data/d3afadff7d5a08e1745b7e48782a869ec4979e78/data/Argentina/Diputados/ep-popolo-v1.0.json':
+    'example-popolo.json',
 }
 
 
-def fake_requests_get(url):
-    leafname = URL_DATA.get(url)
+SENADO_URL_DATA = {
+    'https://raw.githubusercontent.com/everypolitician/everypolitician-data/c323b935f2dce83fcdfcbb5c2f94614a25207d98/data/Argentina/Senado/term-2015.csv':
+    'example-senado-period.csv',
+    'https://cdn.rawgit.com/everypolitician/everypolitician-data/c323b935f2dce83fcdfcbb5c2f94614a25207d98/data/Argentina/Senado/ep-popolo-v1.0.json':
+    'example-senado-popolo.json',
+}
+
+
+def fake_requests_get(url, url_data=URL_DATA, **kwargs):
+    leafname = url_data.get(url)
     if not leafname:
         raise Exception("The URL {0} hasn't been faked".format(url))
     filename = join(dirname(__file__), 'test-data', leafname)
-    if leafname.endswith('.json'):
-        with open(filename) as f:
-            return FakeResponse(json.load(f), None, 200)
-    else:
-        with open(filename, 'rb') as f:
-            return FakeResponse(None, f.read().decode('utf-8'), 200)
+    with open(filename, 'rb') as f:
+        return FakeResponse(f.read(), 200)
 
 
-@patch('everypolitician.lib.requests.get', side_effect=fake_requests_get)
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
 class TestDataLoading(TestCase):
 
     def test_create_ep(self, patched_requests_get):
@@ -130,11 +155,753 @@ class TestDataLoading(TestCase):
         with pytest.raises(NotFound):
             ep.country_legislature('FOO', 'FOO')
 
+    def test_country_lookups_return_the_same_object(self, patched_requests_get):
+        ep = EveryPolitician()
+        assert ep.country('Argentina') is ep.country('Argentina')
+        assert ep.countries()[1] is ep.country('Argentina')
+
+    def test_legislature_lookups_return_the_same_object(self, patched_requests_get):
+        ep = EveryPolitician()
+        c1, l1 = ep.country_legislature('Argentina', 'Diputados')
+        c2, l2 = ep.country_legislature('Argentina', 'Diputados')
+        assert c1 is c2
+        assert l1 is l2
+        assert l1 is c1.legislatures()[0]
+        assert l1.legislative_periods()[0] is l2.legislative_periods()[0]
+
+
+class TestSession(TestCase):
+
+    def test_default_session(self):
+        ep = EveryPolitician()
+        assert ep.session is ep.session
+        assert ep.session.headers['Accept-Encoding'] == 'gzip, deflate'
+        adapter = ep.session.get_adapter('https://raw.githubusercontent.com/')
+        assert adapter.max_retries.total == 3
+
+    def test_make_session_pool_size(self):
+        session = make_session(pool_maxsize=32, max_retries=5)
+        adapter = session.get_adapter('https://raw.githubusercontent.com/')
+        assert adapter._pool_maxsize == 32
+        assert adapter.max_retries.total == 5
+
+    def test_all_fetches_use_injected_session(self):
+        session = MagicMock()
+        session.get.side_effect = fake_requests_get
+        ep = EveryPolitician(session=session, timeout=5)
+        l = ep.country('Argentina').legislature('Diputados')
+        l.popolo()
+        l.legislative_periods()[0].csv()
+        assert session.get.call_count == 3
+        for call in session.get.call_args_list:
+            assert call[1]['timeout'] == 5
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+class TestPrefetch(TestCase):
+
+    def test_prefetch_fills_caches(self, patched_requests_get):
+        ep = EveryPolitician()
+        legislature = ep.country('Argentina').legislature('Diputados')
+        period = legislature.legislative_periods()[0]
+        progress = []
+        result = ep.prefetch(
+            country_slugs=['Argentina'], max_workers=2,
+            progress=lambda obj, kind, error: progress.append((obj, kind)))
+        assert (legislature, 'popolo') in result.loaded
+        assert (period, 'csv') in result.loaded
+        assert len(progress) == 4
+        assert legislature.cached_popolo is not None
+        assert len(period.cached_csv) == 2
+        calls_before = patched_requests_get.call_count
+        legislature.popolo()
+        period.csv()
+        assert patched_requests_get.call_count == calls_before
+
+    def test_prefetch_collects_errors(self, patched_requests_get):
+        ep = EveryPolitician()
+        senado = ep.country('Argentina').legislature('Senado')
+        result = ep.prefetch(country_slugs=['Argentina'], kinds=('popolo',))
+        assert len(result.loaded) == 1
+        assert len(result.errors) == 1
+        obj, kind, error = result.errors[0]
+        assert obj is senado
+        assert kind == 'popolo'
+        assert "hasn't been faked" in str(error)
+
+
+@patch('everypolitician.lib.gc.freeze', create=True)
+class TestPreload(TestCase):
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_preload_builds_indexes(self, patched_requests_get, patched_freeze):
+        ep = EveryPolitician()
+        result = ep.preload()
+        assert result.loaded == []
+        assert ep._period_index is not None
+        for country in ep.countries():
+            for legislature in country.legislatures():
+                assert legislature._period_index is not None
+                assert legislature._directory is not None
+        assert ep._session is None
+        assert patched_freeze.call_count == 0
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_preload_data_closes_session(self, patched_requests_get, patched_freeze):
+        ep = EveryPolitician()
+        result = ep.preload(country_slugs=['Argentina'], kinds=('csv',))
+        period = ep.country('Argentina').legislature('Diputados') \
+            .legislative_periods()[0]
+        assert (period, 'csv') in result.loaded
+        assert period.cached_csv is not None
+        assert ep._session is None
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_preload_closes_session_from_earlier_lookups(self, patched_requests_get, patched_freeze):
+        ep = EveryPolitician()
+        ep.country('Argentina')
+        session = ep._session
+        assert session is not None
+        with patch.object(session, 'close') as patched_close:
+            ep.preload(kinds=('csv',))
+        assert patched_close.call_count == 1
+        assert ep._session is None
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_lazy_preload_only_builds_flat_index(self, patched_requests_get, patched_freeze):
+        ep = EveryPolitician(lazy=True)
+        ep.preload()
+        data = ep.countries_json_data()
+        assert isinstance(data._starts, array)
+        assert isinstance(data.slugs._buffer, bytes)
+        assert not any(data.is_parsed(i) for i in range(len(data)))
+        assert ep._countries_by_slug is None
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_preload_keeps_injected_session(self, patched_requests_get, patched_freeze):
+        session = MagicMock()
+        session.get.side_effect = fake_requests_get
+        ep = EveryPolitician(session=session)
+        ep.preload(country_slugs=['Argentina'], kinds=('csv',), freeze=True)
+        assert ep.session is session
+        assert patched_freeze.call_count == 1
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+    def test_forked_worker_uses_preloaded_data(self, patched_freeze):
+        for lazy in (False, True):
+            self.check_forked_worker(EveryPolitician(lazy=lazy))
+
+    def check_forked_worker(self, ep):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
+            ep.preload()
+        with patch('everypolitician.lib.requests.Session.get', side_effect=Exception('No network')):
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    legislature = ep.country('Argentina').legislature('Diputados')
+                    if legislature.period_on('2016-01-01').id == 'term/133':
+                        status = 0
+                finally:
+                    os._exit(status)
+            _, status = os.waitpid(pid, 0)
+        assert status == 0
+
+
+def person_names(json_data):
+    return [p['name'] for p in json_data['persons']]
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+class TestLoadPopoloMany(TestCase):
+
+    def setUp(self):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
+            self.ep = EveryPolitician()
+            self.legislature = self.ep.country('Argentina').legislature('Diputados')
+
+    def test_parsed_in_processes_and_cached(self, patched_requests_get):
+        popolos = self.ep.load_popolo_many([self.legislature], processes=2)
+        assert len(popolos) == 1
+        assert isinstance(popolos[0], Popolo)
+        assert popolos[0].persons.first.name == 'ADELA ROSA SEGARRA'
+        assert self.legislature.cached_popolo is popolos[0]
+        calls_before = patched_requests_get.call_count
+        assert self.ep.load_popolo_many([self.legislature]) == popolos
+        assert self.legislature.popolo() is popolos[0]
+        assert patched_requests_get.call_count == calls_before
+
+    def test_transform(self, patched_requests_get):
+        names = self.ep.load_popolo_many(
+            [self.legislature], processes=1, transform=person_names)
+        assert names == [['ADELA ROSA SEGARRA', 'ADRIAN PEREZ']]
+        assert self.legislature.cached_popolo is None
+
+    def test_errors_raised(self, patched_requests_get):
+        senado = self.ep.country('Argentina').legislature('Senado')
+        with self.assertRaises(Exception):
+            self.ep.load_popolo_many([self.legislature, senado], processes=1)
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+class TestStreamingCSV(TestCase):
+
+    def setUp(self):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
+            self.ep = EveryPolitician()
+            self.period = self.ep.country('Argentina') \
+                .legislature('Diputados').legislative_periods()[0]
+
+    def test_iter_csv_streams_rows(self, patched_requests_get):
+        rows = self.period.iter_csv()
+        first = next(rows)
+        assert first['name'] == 'ADELA ROSA SEGARRA'
+        assert first['chamber'] == 'Cámara de Diputados'
+        assert [r['name'] for r in rows] == ['ADRIAN PEREZ']
+        assert patched_requests_get.call_args[1]['stream'] is True
+        assert self.period.cached_csv is None
+
+    def test_iter_csv_same_as_csv(self, patched_requests_get):
+        assert list(self.period.iter_csv()) == self.period.csv()
+        assert list(self.period.iter_csv()) == self.period.csv()
+        assert patched_requests_get.call_count == 2
+
+    def test_csv_as_tuples(self, patched_requests_get):
+        rows = self.period.csv(row_type='tuple')
+        assert [r.name for r in rows] == ['ADELA ROSA SEGARRA', 'ADRIAN PEREZ']
+        assert rows[0].chamber == 'Cámara de Diputados'
+        assert type(rows[0]) is type(rows[1])
+        assert not hasattr(rows[0], '__dict__')
+
+    def test_csv_as_columns(self, patched_requests_get):
+        columns = self.period.csv(row_type='columnar')
+        assert list(columns)[:3] == ['id', 'name', 'sort_name']
+        assert columns['gender'] == ['female', 'male']
+        assert columns['area'][0] is columns['area'][1]
+
+    def test_csv_as_tuples_from_cached_rows(self, patched_requests_get):
+        dicts = self.period.csv()
+        rows = self.period.csv(row_type='tuple')
+        assert patched_requests_get.call_count == 1
+        assert [r._asdict() for r in rows] == dicts
+
+    def test_csv_columns_and_where(self, patched_requests_get):
+        rows = self.period.csv(
+            columns=['name', 'group'], where={'group': 'FRENTE RENOVADOR'})
+        assert rows == [{'name': 'ADRIAN PEREZ', 'group': 'FRENTE RENOVADOR'}]
+        assert self.period.cached_csv is None
+        rows = self.period.csv(
+            row_type='tuple', columns=['id'],
+            where=lambda row: row['gender'] == 'female')
+        assert [r.id for r in rows] == ['b882751f-4014-4f6f-b3cf-e0a5d6d3c605']
+        columns = self.period.csv(row_type='columnar', columns=['area', 'name'])
+        assert list(columns) == ['area', 'name']
+
+    def test_iter_csv_columns_and_where_from_cached_rows(self, patched_requests_get):
+        self.period.csv()
+        rows = self.period.iter_csv(
+            columns=['name'], where={'gender': ['male', 'other']})
+        assert list(rows) == [{'name': 'ADRIAN PEREZ'}]
+        assert patched_requests_get.call_count == 1
+
+    def test_csv_unknown_row_type(self, patched_requests_get):
+        with pytest.raises(ValueError):
+            self.period.csv(row_type='xml')
+
+    def test_iter_csv_from_disk_cache(self, patched_requests_get):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            ep = EveryPolitician(cache_dir=cache_dir)
+            period = ep.country('Argentina') \
+                .legislature('Diputados').legislative_periods()[0]
+            first_rows = list(period.iter_csv())
+            calls_before = patched_requests_get.call_count
+            assert list(period.iter_csv()) == first_rows
+            assert patched_requests_get.call_count == calls_before
+            assert ep.cache_stats()['hits'] == 1
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class TestLazyLoading(TestCase):
+
+    def setUp(self):
+        self.ep = EveryPolitician(
+            countries_json_filename=join(
+                dirname(__file__), 'test-data', 'example-countries.json'),
+            lazy=True)
+
+    def test_country_only_parses_that_country(self):
+        country, legislature = self.ep.country_legislature(
+            'Argentina', 'Diputados')
+        assert legislature.name == 'Cámara de Diputados'
+        data = self.ep.countries_json_data()
+        assert [data.is_parsed(i) for i in range(3)] == [False, True, False]
+
+    def test_country_not_found(self):
+        with pytest.raises(NotFound):
+            self.ep.country('argentina')
+
+    def test_identity_kept_when_all_countries_loaded(self):
+        argentina = self.ep.country('Argentina')
+        countries = self.ep.countries()
+        assert [c.slug for c in countries] == \
+            ['Aland', 'Argentina', 'British-Virgin-Islands']
+        assert countries[1] is argentina
+        assert self.ep.country('Argentina') is argentina
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_lazy_from_url(self, patched_requests_get):
+        ep = EveryPolitician(lazy=True)
+        assert ep.country('Aland').name == 'Åland'
+
+    def test_concurrent_lookups(self):
+        found = []
+        threads = [
+            threading.Thread(
+                target=lambda: found.append(self.ep.country('Argentina')))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(map(id, found))) == 1
+        assert [c.slug for c in self.ep.countries()] == \
+            ['Aland', 'Argentina', 'British-Virgin-Islands']
+        assert self.ep.countries()[1] is found[0]
+
+    def test_scan_kept_in_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            filename = join(dirname(__file__), 'test-data', 'example-countries.json')
+            with patch('everypolitician.lib.scan_countries_json',
+                       side_effect=scan_countries_json) as patched_scan:
+                for i in range(2):
+                    ep = EveryPolitician(
+                        countries_json_filename=filename, cache_dir=cache_dir,
+                        lazy=True)
+                    assert ep.country('Argentina').name == 'Argentina'
+                assert patched_scan.call_count == 1
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class TestRefresh(TestCase):
+
+    def setUp(self):
+        with open(join(dirname(__file__), 'test-data', 'example-countries.json'), 'rb') as f:
+            self.countries_json_data = json.loads(f.read().decode('utf-8'))
+        self.directory = tempfile.mkdtemp()
+        self.filename = join(self.directory, 'countries.json')
+        self.write_countries_json()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_countries_json(self):
+        with open(self.filename, 'wb') as f:
+            f.write(json.dumps(self.countries_json_data).encode('utf-8'))
+
+    def test_refresh(self):
+        ep = EveryPolitician(countries_json_filename=self.filename)
+        argentina, diputados = ep.country_legislature('Argentina', 'Diputados')
+        senado = argentina.legislature('Senado')
+        diputados_period = diputados.legislative_periods()[0]
+        diputados.cached_popolo = senado.cached_popolo = 'cached'
+        # Change the Senado data, remove Åland and add a new legislature:
+        aland, argentina_data, _ = self.countries_json_data
+        self.countries_json_data.remove(aland)
+        argentina_data['legislatures'][1]['sha'] = 'abc123'
+        new_legislature = dict(argentina_data['legislatures'][1], slug='New')
+        argentina_data['legislatures'].append(new_legislature)
+        self.write_countries_json()
+
+        changes = ep.refresh()
+        assert changes.added == [('Argentina', 'New')]
+        assert changes.removed == [('Aland', 'Lagting')]
+        assert changes.changed == [('Argentina', 'Senado')]
+        assert ep.country('Argentina') is argentina
+        assert argentina.legislature('Diputados') is diputados
+        assert diputados.cached_popolo == 'cached'
+        assert diputados.legislative_periods()[0] is diputados_period
+        new_senado = argentina.legislature('Senado')
+        assert new_senado.sha == 'abc123'
+        assert new_senado.cached_popolo is None
+        assert argentina.legislature('New').name == 'Cámara de Senadores'
+        assert [c.slug for c in ep.countries()] == \
+            ['Argentina', 'British-Virgin-Islands']
+        with pytest.raises(NotFound):
+            ep.country('Aland')
+
+    def test_refresh_with_nothing_changed(self):
+        ep = EveryPolitician(countries_json_filename=self.filename, lazy=True)
+        argentina = ep.country('Argentina')
+        changes = ep.refresh()
+        assert changes == ([], [], [])
+        assert ep.country('Argentina') is argentina
+
+    def test_lazy_refresh_leaves_unparsed_countries(self):
+        ep = EveryPolitician(countries_json_filename=self.filename, lazy=True)
+        argentina, diputados = ep.country_legislature('Argentina', 'Diputados')
+        old_data = ep.countries_json_data()
+        self.countries_json_data[1]['legislatures'][0]['sha'] = 'abc123'
+        self.write_countries_json()
+        changes = ep.refresh()
+        assert changes == ([], [], [('Argentina', 'Diputados')])
+        assert not old_data.is_parsed(0)
+        assert not old_data.is_parsed(2)
+        new_data = ep.countries_json_data()
+        assert [new_data.is_parsed(i) for i in range(3)] == \
+            [False, True, False]
+        assert ep.country('Argentina') is argentina
+        assert argentina.legislature('Diputados').sha == 'abc123'
+        assert [c.slug for c in ep.countries()] == \
+            ['Aland', 'Argentina', 'British-Virgin-Islands']
+        assert ep.countries()[1] is argentina
+
+    def test_refresh_before_loading(self):
+        ep = EveryPolitician(countries_json_filename=self.filename)
+        changes = ep.refresh()
+        assert len(changes.added) == 5
+        assert len(ep.countries()) == 3
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=Exception('No network'))
+class TestDataRepoPath(TestCase):
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        test_data = join(dirname(__file__), 'test-data')
+        directory = join(self.repo, 'data', 'Argentina', 'Diputados')
+        os.makedirs(directory)
+        shutil.copy(
+            join(test_data, 'example-countries.json'),
+            join(self.repo, 'countries.json'))
+        shutil.copy(
+            join(test_data, 'example-popolo.json'),
+            join(directory, 'ep-popolo-v1.0.json'))
+        shutil.copy(
+            join(test_data, 'example-period.csv'),
+            join(directory, 'term-133.csv'))
+
+    def tearDown(self):
+        shutil.rmtree(self.repo)
+
+    def test_everything_read_from_repo(self, patched_requests_get):
+        ep = EveryPolitician(data_repo_path=self.repo)
+        assert ep.countries_json_filename == join(self.repo, 'countries.json')
+        diputados = ep.country('Argentina').legislature('Diputados')
+        assert len(diputados.popolo().persons) == 2
+        period = diputados.legislative_periods()[0]
+        assert [r['name'] for r in period.iter_csv()] == \
+            ['ADELA ROSA SEGARRA', 'ADRIAN PEREZ']
+        assert len(period.csv(row_type='tuple')) == 2
+        assert patched_requests_get.call_count == 0
+
+    def test_lazy_countries_json_rewritten_in_place(self, patched_requests_get):
+        ep = EveryPolitician(data_repo_path=self.repo, lazy=True)
+        assert ep.country('Argentina').name == 'Argentina'
+        filename = join(self.repo, 'countries.json')
+        with open(filename, 'r+b') as f:
+            f.truncate(0)
+            f.write(b'[]')
+        assert ep.country('Aland').name == 'Åland'
+        assert len(ep.countries()) == 3
+        changes = ep.refresh()
+        assert len(changes.removed) == 5
+        assert ep.countries() == []
+
+    def test_missing_file(self, patched_requests_get):
+        ep = EveryPolitician(data_repo_path=self.repo)
+        senado = ep.country('Argentina').legislature('Senado')
+        with pytest.raises(IOError):
+            senado.popolo()
+
+
+def fake_requests_get_with_senado(url, **kwargs):
+    return fake_requests_get(
+        url, url_data=dict(URL_DATA, **SENADO_URL_DATA), **kwargs)
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get_with_senado)
+class TestPeopleIndex(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_lookups(self, patched_requests_get):
+        ep = EveryPolitician()
+        index = ep.people_index(country_slugs=['Argentina'])
+        assert len(index) == 4
+        memberships = index.by_identifier('Q21480579')
+        assert [(m.legislature.slug, m.legislative_period.id)
+                for m in memberships] == \
+            [('Diputados', 'term/133'), ('Senado', 'term/2015')]
+        assert memberships[0].country is ep.country('Argentina')
+        assert index.by_name('adela rosa  segarra') == memberships
+        assert [m.legislature.slug for m in index.by_name('Adrian Pérez')] == \
+            ['Diputados']
+        assert index.by_id('b882751f-4014-4f6f-b3cf-e0a5d6d3c605') == \
+            memberships[:1]
+        assert index.by_id('missing') == []
+
+    def test_shards_stored_in_cache(self, patched_requests_get):
+        ep = EveryPolitician(cache_dir=self.cache_dir)
+        ep.people_index(country_slugs=['Argentina'])
+        calls_before = patched_requests_get.call_count
+        ep.people_index(country_slugs=['Argentina'])
+        ep = EveryPolitician(cache_dir=self.cache_dir)
+        index = ep.people_index(country_slugs=['Argentina'])
+        # Only countries.json is loaded again:
+        assert patched_requests_get.call_count == calls_before + 1
+        assert len(index.by_identifier('Q21480579')) == 2
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get_with_senado)
+class TestMembershipsTable(TestCase):
+
+    def test_all_periods(self, patched_requests_get):
+        ep = EveryPolitician()
+        table = ep.memberships_table(
+            country_slugs=['Argentina'], columns=['name', 'group'])
+        assert len(table) == 4
+        assert list(table.columns)[3:] == ['name', 'group']
+        assert table['legislature_slug'].values() == \
+            ['Diputados', 'Diputados', 'Senado', 'Senado']
+        assert table['group'].categories == [
+            'FRENTE PARA LA VICTORIA - PJ', 'FRENTE RENOVADOR', 'UCR']
+        assert table['group'].values()[2] == 'FRENTE PARA LA VICTORIA - PJ'
+
+    def test_latest_periods_where(self, patched_requests_get):
+        ep = EveryPolitician()
+        table = ep.memberships_table(
+            country_slugs=['Argentina'], periods='latest',
+            where={'group': 'UCR'})
+        assert table['name'].values() == ['MARIO CIMADEVILLA']
+        assert table['gender'].values() == [None]
+
+    def test_unknown_periods(self, patched_requests_get):
+        with pytest.raises(ValueError):
+            EveryPolitician().memberships_table(periods='first')
+
+
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+class TestInstrumentation(TestCase):
+
+    def test_fetches_reported(self, patched_requests_get):
+        ep = EveryPolitician()
+        events = []
+        ep.instrumentation.add_hook(events.append)
+        legislature = ep.country('Argentina').legislature('Diputados')
+        legislature.popolo()
+        period = legislature.legislative_periods()[0]
+        list(period.iter_csv())
+        assert [e.kind for e in events] == ['countries_json', 'popolo', 'csv']
+        assert [e.source for e in events] == ['network'] * 3
+        countries_json, popolo, csv = events
+        assert countries_json.url == ep.countries_json_url
+        assert popolo.legislature is legislature
+        assert popolo.bytes == os.path.getsize(
+            join(dirname(__file__), 'test-data', 'example-popolo.json'))
+        assert csv.legislative_period is period
+        assert csv.legislature is legislature
+        assert csv.bytes > 0
+        assert ep.instrumentation.stats()['cache_misses'] == 3
+
+    def test_failing_hook_doesnt_stop_loading(self, patched_requests_get):
+        ep = EveryPolitician()
+
+        def broken_hook(event):
+            raise RuntimeError('broken')
+        ep.instrumentation.add_hook(broken_hook)
+        legislature = ep.country('Argentina').legislature('Diputados')
+        with patch('everypolitician.instrumentation.logger') as patched_logger:
+            assert len(legislature.popolo().persons) == 2
+        assert legislature.cached_popolo is not None
+        assert patched_logger.exception.call_count == 1
+
+    def test_cache_hits_and_errors_reported(self, patched_requests_get):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            EveryPolitician(cache_dir=cache_dir).country('Argentina') \
+                .legislature('Diputados').popolo()
+            ep = EveryPolitician(cache_dir=cache_dir)
+            events = []
+            ep.instrumentation.add_hook(events.append)
+            argentina = ep.country('Argentina')
+            argentina.legislature('Diputados').popolo()
+            with pytest.raises(Exception):
+                argentina.legislature('Senado').popolo()
+        finally:
+            shutil.rmtree(cache_dir)
+        assert [(e.kind, e.source) for e in events] == [
+            ('countries_json', 'network'), ('popolo', 'cache'),
+            ('popolo', 'network')]
+        assert events[2].error is not None
+        stats = ep.instrumentation.stats()
+        assert stats['cache_hits'] == 1
+        assert stats['errors'] == 1
+
+
+class TestTurnover(TestCase):
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        shutil.copy(
+            join(dirname(__file__), 'test-data', 'example-countries.json'),
+            join(self.repo, 'countries.json'))
+        directory = join(self.repo, 'data', 'Aland', 'Lagting')
+        os.makedirs(directory)
+        terms = {
+            '2007': 'a,Red,North\nb,Red,South\nc,Blue,East\n',
+            '2011': 'a,Red,North\nb,Blue,South\nd,Blue,East\n',
+            '2015': 'a,Red,West\nd,Blue,East\n',
+        }
+        for term, rows in terms.items():
+            with open(join(directory, 'term-{0}.csv'.format(term)), 'w') as f:
+                f.write('id,group,area\n' + rows)
+        self.ep = EveryPolitician(data_repo_path=self.repo)
+        self.lagting = self.ep.country('Aland').legislature('Lagting')
+
+    def tearDown(self):
+        shutil.rmtree(self.repo)
+
+    def test_diff(self):
+        periods = dict((lp.id, lp) for lp in self.lagting.legislative_periods())
+        diff = periods['term/2007'].diff(periods['term/2011'])
+        assert diff.old is periods['term/2007']
+        assert diff.joined == ['d']
+        assert diff.left == ['c']
+        assert diff.group_changes == [('b', 'Red', 'Blue')]
+        assert diff.area_changes == []
+
+    def test_turnover_in_date_order(self):
+        diffs = self.lagting.turnover()
+        assert [(d.old.id, d.new.id) for d in diffs] == [
+            ('term/2007', 'term/2011'), ('term/2011', 'term/2015')]
+        assert diffs[1].left == ['b']
+        assert diffs[1].area_changes == [('a', 'North', 'West')]
+
+    def test_turnover_reads_each_csv_once(self):
+        events = []
+        self.ep.instrumentation.add_hook(events.append)
+        self.lagting.turnover()
+        assert sorted(e.url for e in events if e.kind == 'csv') == sorted(
+            lp.csv_url for lp in self.lagting.legislative_periods())
+
+
+class TestSnapshot(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = join(self.directory, 'ep.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def save_snapshot(self):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
+            ep = EveryPolitician()
+            diputados = ep.country('Argentina').legislature('Diputados')
+            diputados.popolo()
+            self.rows = diputados.legislative_periods()[0].csv()
+            ep.save_snapshot(self.filename)
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=Exception('No network'))
+    def test_from_snapshot(self, patched_requests_get):
+        self.save_snapshot()
+        ep = EveryPolitician.from_snapshot(self.filename)
+        assert repr(ep) == 'EveryPolitician()'
+        diputados = ep.country('Argentina').legislature('Diputados')
+        assert ep.countries_json_data().is_parsed(1)
+        assert not ep.countries_json_data().is_parsed(0)
+        assert diputados.popolo().persons.first.name == 'ADELA ROSA SEGARRA'
+        period = diputados.legislative_periods()[0]
+        assert list(period.iter_csv()) == self.rows
+        assert period.csv() == self.rows
+        assert len(ep.countries()) == 3
+        assert patched_requests_get.call_count == 0
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=Exception('No network'))
+    def test_snapshot_of_snapshot_keeps_files(self, patched_requests_get):
+        self.save_snapshot()
+        filename = join(self.directory, 'again.snapshot')
+        EveryPolitician.from_snapshot(self.filename).save_snapshot(filename)
+        ep = EveryPolitician.from_snapshot(filename)
+        period = ep.country('Argentina').legislature('Diputados') \
+            .legislative_periods()[0]
+        assert period.csv() == self.rows
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=Exception('No network'))
+    def test_close_snapshot(self, patched_requests_get):
+        self.save_snapshot()
+        with EveryPolitician.from_snapshot(self.filename) as ep:
+            snapshot = ep._snapshot
+            assert ep.country('Argentina').name == 'Argentina'
+        assert ep._snapshot is None
+        with pytest.raises(ValueError):
+            snapshot.read(0, 1)
+
+    def test_not_a_snapshot(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'[]')
+        with pytest.raises(SnapshotError):
+            EveryPolitician.from_snapshot(self.filename)
+
+
+class TestOnDiskCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_popolo_and_csv_read_from_cache(self):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get) as patched:
+            ep = EveryPolitician(cache_dir=self.cache_dir)
+            l = ep.country('Argentina').legislature('Diputados')
+            l.popolo()
+            rows = l.legislative_periods()[0].csv()
+            assert patched.call_count == 3
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get) as patched:
+            ep = EveryPolitician(cache_dir=self.cache_dir)
+            l = ep.country('Argentina').legislature('Diputados')
+            assert len(l.popolo().persons) == 2
+            assert l.legislative_periods()[0].csv() == rows
+            # Only countries.json should have been fetched again, since
+            # the fake server doesn't send an ETag or Last-Modified:
+            assert patched.call_count == 1
+        stats = ep.cache_stats()
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['bytes_saved'] > 0
+
+    def test_countries_json_revalidated_with_etag(self):
+        def fake_get(url, headers=None, **kwargs):
+            if headers and headers.get('If-None-Match') == '"v1"':
+                return FakeResponse(b'', 304)
+            response = fake_requests_get(url)
+            response.headers['ETag'] = '"v1"'
+            return response
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_get):
+            EveryPolitician(cache_dir=self.cache_dir).countries_json_data()
+            ep = EveryPolitician(cache_dir=self.cache_dir)
+            assert len(ep.countries()) == 3
+        assert ep.cache_stats()['hits'] == 1
+
+    def test_no_cache_stats(self):
+        assert EveryPolitician().cache_stats() == \
+            {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+
 
 class TestCountryMethods(TestCase):
 
     def setUp(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             self.ep = EveryPolitician()
             self.country_aland = self.ep.country('Aland')
             self.country_argentina = self.ep.country('Argentina')
@@ -163,11 +930,51 @@ class TestCountryMethods(TestCase):
     def test_upper_house_shortcut(self):
         assert self.country_argentina.upper_house().name == 'Cámara de Senadores'
 
+    def test_period_on(self):
+        lagting = self.country_aland.legislature('Lagting')
+        assert lagting.period_on('2013-04-01').slug == '2011'
+        assert lagting.period_on(date(2015, 12, 1)).slug == '2015'
+        assert lagting.period_on('2030') is None
+        assert lagting.period_on('1999-01-01') is None
+
+    def test_houses_active_on(self):
+        houses = self.country_bv.houses_active_on('2005-01-01')
+        assert [h.slug for h in houses] == ['Council']
+        houses = self.country_argentina.houses_active_on(date(2016, 1, 1))
+        assert [h.slug for h in houses] == ['Diputados', 'Senado']
+
+    def test_periods_overlapping(self):
+        periods = self.ep.periods_overlapping('1990', '1994')
+        assert [(p.legislature.slug, p.slug) for p in periods] == \
+            [('Council', '1986'), ('Council', '1990')]
+        periods = self.ep.periods_overlapping('2018-01-01', '2018-12-31')
+        assert sorted(p.country.slug for p in periods) == \
+            ['Aland', 'Argentina', 'British-Virgin-Islands']
+
+    def test_latest_legislative_period_only_computed_once(self):
+        lagting = self.country_aland.legislature('Lagting')
+        assert lagting.latest_legislative_period() is \
+            lagting.latest_legislative_period()
+        assert lagting.latest_legislative_period().slug == '2015'
+
+    def test_latest_legislative_period_compares_dates(self):
+        data = dict(self.country_aland.legislature('Lagting').legislature_data)
+        data['legislative_periods'] = [
+            {'id': 'term/a', 'name': 'A', 'slug': 'a', 'start_date': '2015-10-01'},
+            {'id': 'term/b', 'name': 'B', 'slug': 'b'},
+            {'id': 'term/c', 'name': 'C', 'slug': 'c', 'start_date': '2015-3-01'},
+        ]
+        legislature = Legislature(data, self.country_aland)
+        assert legislature.latest_legislative_period().slug == 'a'
+        data['legislative_periods'] = []
+        assert Legislature(data, self.country_aland) \
+            .latest_legislative_period() is None
+
 
 class TestCountryHousesMethod(TestCase):
 
     def test_finds_unicameral_legislature_for_lower_house(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             ep = EveryPolitician()
             country = ep.country('Aland')
             houses = country.houses('lower house')
@@ -175,7 +982,7 @@ class TestCountryHousesMethod(TestCase):
             assert houses[0].name == 'Lagting'
 
     def test_finds_lower_house_if_present(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             ep = EveryPolitician()
             country = ep.country('Argentina')
             houses = country.houses('lower house')
@@ -183,7 +990,7 @@ class TestCountryHousesMethod(TestCase):
             assert houses[0].name == 'Cámara de Diputados'
 
     def test_finds_upper_house_if_present(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             ep = EveryPolitician()
             country = ep.country('Argentina')
             houses = country.houses('upper house')
@@ -191,7 +998,7 @@ class TestCountryHousesMethod(TestCase):
             assert houses[0].name == 'Cámara de Senadores'
 
     def test_no_matches_for_unknown_house_type(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             ep = EveryPolitician()
             country = ep.country('Argentina')
             houses = country.houses('quiet area')
@@ -201,7 +1008,7 @@ class TestCountryHousesMethod(TestCase):
 class TestLeglislatureMethods(TestCase):
 
     def setUp(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             self.ep = EveryPolitician()
             self.country = self.ep.country('Argentina')
         self.legislatures = self.country.legislatures()
@@ -225,42 +1032,59 @@ class TestLeglislatureMethods(TestCase):
         l = self.legislatures[0]
         assert l.directory() == 'Argentina/Diputados'
 
-    @patch('everypolitician.lib.Popolo')
-    def test_popolo_call(self, mocked_popolo_class):
-        mocked_popolo_class.from_url.return_value = Popolo({
-            'persons': [
-                {'name': 'Joe Bloggs'}
-            ]
-        })
+    def test_lastmod(self):
+        l = self.legislatures[0]
+        assert l.lastmod == datetime(2016, 10, 28, 6, 23, 1)
+
+    def test_no_instance_dicts(self):
+        l = self.legislatures[0]
+        for obj in (self.country, l, l.legislative_periods()[0]):
+            assert not hasattr(obj, '__dict__')
+
+    def test_popolo_path(self):
+        l = self.legislatures[0]
+        assert l.popolo_path == 'data/Argentina/Diputados/ep-popolo-v1.0.json'
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_popolo_call(self, patched_requests_get):
         l = self.legislatures[0]
         popolo = l.popolo()
-        mocked_popolo_class.from_url.assert_called_with(
+        patched_requests_get.assert_called_with(
             u'https://cdn.rawgit.com/everypolitician/everypolitician-data/'
             u'd3afadff7d5a08e1745b7e48782a869ec4979e78/data/Argentina/'
-            u'Diputados/ep-popolo-v1.0.json')
-        assert len(popolo.persons) == 1
-        assert popolo.persons.first.name == 'Joe Bloggs'
-
-    @patch('everypolitician.lib.Popolo')
-    def test_popolo_data_only_fetched_once(self, mocked_popolo_class):
-        mocked_popolo_class.from_url.return_value = Popolo({
-            'persons': [
-                {'name': 'Joe Bloggs'}
-            ]
-        })
+            u'Diputados/ep-popolo-v1.0.json', timeout=DEFAULT_TIMEOUT)
+        assert isinstance(popolo, Popolo)
+        assert len(popolo.persons) == 2
+        assert popolo.persons.first.name == 'ADELA ROSA SEGARRA'
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_popolo_data_only_fetched_once(self, patched_requests_get):
         l = self.legislatures[0]
         l.popolo()
         l.popolo()
-        mocked_popolo_class.from_url.assert_called_once_with(
+        patched_requests_get.assert_called_once_with(
             u'https://cdn.rawgit.com/everypolitician/everypolitician-data/'
             u'd3afadff7d5a08e1745b7e48782a869ec4979e78/data/Argentina/'
-            u'Diputados/ep-popolo-v1.0.json')
+            u'Diputados/ep-popolo-v1.0.json', timeout=DEFAULT_TIMEOUT)
+
+    @patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
+    def test_popolo_evicted_when_cache_full(self, patched_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
+            ep = EveryPolitician(popolo_cache_max_bytes=1)
+            l = ep.country('Argentina').legislature('Diputados')
+        popolo = l.popolo()
+        assert l.cached_popolo is popolo
+        assert ep.popolo_cache.total_bytes > 1
+        ep.popolo_cache.put('other', object(), 1)
+        assert l.cached_popolo is None
+        l.popolo()
+        assert patched_requests_get.call_count == 2
 
-@patch('everypolitician.lib.requests.get', side_effect=fake_requests_get)
+@patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get)
 class TestLegislativePeriod(TestCase):
 
     def setUp(self):
-        with patch('everypolitician.lib.requests.get', side_effect=fake_requests_get):
+        with patch('everypolitician.lib.requests.Session.get', side_effect=fake_requests_get):
             self.ep = EveryPolitician()
             self.country = self.ep.country('Argentina')
             self.legislature = self.country.legislature('Diputados')
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from everypolitician.cache import DiskCache, MemoryCache
+
+
+class TestDiskCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_miss_then_hit(self):
+        cache = DiskCache(self.directory)
+        assert cache.get('abc/data/foo.csv') is None
+        cache.put('abc/data/foo.csv', b'a,b\n1,2\n')
+        assert cache.get('abc/data/foo.csv') == b'a,b\n1,2\n'
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'bytes_saved': 8}
+
+    def test_entries_shared_between_instances(self):
+        DiskCache(self.directory).put('abc/foo.json', b'{}')
+        assert DiskCache(self.directory).get('abc/foo.json') == b'{}'
+
+    def test_keys_cannot_escape_the_directory(self):
+        cache = DiskCache(self.directory)
+        assert cache.path_for('../../etc/passwd') == \
+            os.path.join(self.directory, 'etc', 'passwd')
+
+    def test_metadata(self):
+        cache = DiskCache(self.directory)
+        assert cache.metadata('urls/x') is None
+        cache.put('urls/x', b'[]', {'etag': '"1234"'})
+        assert cache.metadata('urls/x') == {'etag': '"1234"'}
+
+    def test_least_recently_used_entries_evicted(self):
+        cache = DiskCache(self.directory, max_bytes=10)
+        cache.put('a', b'1234')
+        cache.put('b', b'5678')
+        # Make 'a' look older than 'b', then use 'a' so that it's the
+        # most recently used:
+        old = time.time() - 60
+        os.utime(cache.path_for('a'), (old - 60, old - 60))
+        os.utime(cache.path_for('b'), (old, old))
+        assert cache.get('a') == b'1234'
+        cache.put('c', b'9012')
+        assert cache.get('b') is None
+        assert cache.get('a') == b'1234'
+        assert cache.get('c') == b'9012'
+
+    def test_put_stream(self):
+        cache = DiskCache(self.directory)
+        chunks = cache.put_stream('abc/foo.csv', [b'a,b\n', b'1,2\n'])
+        assert cache.get('abc/foo.csv') is None
+        assert list(chunks) == [b'a,b\n', b'1,2\n']
+        with cache.open('abc/foo.csv') as f:
+            assert f.read() == b'a,b\n1,2\n'
+        assert cache.stats()['bytes_saved'] == 8
+
+    def test_put_stream_not_stored_if_abandoned(self):
+        cache = DiskCache(self.directory)
+        chunks = cache.put_stream('abc/foo.csv', [b'a,b\n', b'1,2\n'])
+        next(chunks)
+        chunks.close()
+        assert cache.open('abc/foo.csv') is None
+        assert os.listdir(os.path.join(self.directory, 'abc')) == []
+
+
+class TestMemoryCache(TestCase):
+
+    def test_least_recently_used_entry_evicted(self):
+        cache = MemoryCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        assert 'b' not in cache
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_evicted_to_fit_max_bytes(self):
+        cache = MemoryCache(max_bytes=10)
+        cache.put('a', 1, 4)
+        cache.put('b', 2, 4)
+        cache.put('c', 3, 4)
+        assert 'a' not in cache
+        assert len(cache) == 2
+        assert cache.total_bytes == 8
+        # An entry bigger than the limit is still kept on its own:
+        cache.put('d', 4, 20)
+        assert len(cache) == 1
+        assert cache.get('d') == 4
+
+    def test_discard(self):
+        cache = MemoryCache()
+        cache.put('a', 1, 5)
+        cache.discard('a')
+        cache.discard('missing')
+        assert cache.get('a') is None
+        assert cache.total_bytes == 0
+
+    def test_concurrent_loads_share_one_call(self):
+        cache = MemoryCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'value', 5
+
+        results = []
+
+        def worker():
+            results.append(cache.get_or_load('key', load))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        threads[0].start()
+        started.wait()
+        for t in threads[1:]:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join()
+        assert calls == [1]
+        assert results == ['value'] * 4
+        assert cache.get_or_load('key', load) == 'value'
+        assert calls == [1]
+
+    def test_load_error_raised_and_not_cached(self):
+        cache = MemoryCache()
+
+        def fail():
+            raise ValueError('broken')
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load('key', fail)
+        assert 'key' not in cache
+        assert cache.get_or_load('key', lambda: ('value', 1)) == 'value'
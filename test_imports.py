@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+import subprocess
+import sys
+from unittest import TestCase
+
+import pytest
+
+import everypolitician
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 5), reason='needs module __class__ assignment')
+class TestDeferredImports(TestCase):
+
+    def test_heavy_modules_not_imported(self):
+        script = (
+            'import json, sys, everypolitician\n'
+            'print(json.dumps([m for m in ("requests", "popolo_data", "six") '
+            'if m in sys.modules]))')
+        output = subprocess.check_output([sys.executable, '-c', script])
+        assert json.loads(output.decode('utf-8')) == []
+
+    def test_public_names_still_available(self):
+        from popolo_data.importer import Popolo
+        import requests
+        assert everypolitician.Popolo is Popolo
+        assert everypolitician.lib.Popolo is Popolo
+        assert everypolitician.make_session().__class__ is requests.Session
+        with pytest.raises(AttributeError):
+            everypolitician.no_such_name
+
+    def test_star_import_only_public_names(self):
+        script = (
+            'import json, sys\n'
+            'from everypolitician import *\n'
+            'print(json.dumps(sorted(n for n in dir() if not n.startswith("_"))))')
+        output = subprocess.check_output([sys.executable, '-c', script])
+        names = json.loads(output.decode('utf-8'))
+        assert 'EveryPolitician' in names
+        assert 'Popolo' in names
+        for name in ('DeferredModule', 'gc', 'marshal', 'hashlib', 'Retry'):
+            assert name not in names
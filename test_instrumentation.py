@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from everypolitician.instrumentation import (
+    NO_TIMER, Instrumentation, response_retries)
+
+
+class TestInstrumentation(TestCase):
+
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+        self.events = []
+        self.instrumentation.add_hook(self.events.append)
+
+    def test_event_recorded(self):
+        with self.instrumentation.timer('popolo', 'http://x/p.json') as timer:
+            timer.source = 'cache'
+            timer.downloaded(b'12345')
+        event, = self.events
+        assert event.kind == 'popolo'
+        assert event.url == 'http://x/p.json'
+        assert event.bytes == 5
+        assert event.cache_hit
+        assert event.error is None
+        assert event.download_seconds >= 0 and event.parse_seconds >= 0
+        stats = self.instrumentation.stats()
+        assert stats['fetches'] == 1
+        assert stats['cache_hits'] == 1
+        assert stats['bytes'] == 5
+
+    def test_error_recorded_and_raised(self):
+        with self.assertRaises(ValueError):
+            with self.instrumentation.timer('csv', 'http://x/t.csv'):
+                raise ValueError('broken')
+        assert isinstance(self.events[0].error, ValueError)
+        assert self.instrumentation.stats()['errors'] == 1
+
+    def test_failing_hook_logged(self):
+        def broken_hook(event):
+            raise RuntimeError('broken')
+        self.instrumentation.hooks.insert(0, broken_hook)
+        with patch('everypolitician.instrumentation.logger') as patched_logger:
+            with self.instrumentation.timer('csv', 'http://x/t.csv'):
+                pass
+        assert patched_logger.exception.call_count == 1
+        assert len(self.events) == 1
+        assert self.instrumentation.stats()['fetches'] == 1
+
+    def test_timed_chunks(self):
+        with self.instrumentation.timer('csv', 'http://x/t.csv') as timer:
+            assert b''.join(timer.timed_chunks([b'ab', b'cde'])) == b'abcde'
+        assert self.events[0].bytes == 5
+        assert not self.events[0].cache_hit
+
+    def test_abandoned_stream_not_an_error(self):
+        def stream():
+            with self.instrumentation.timer('csv', 'http://x/t.csv') as timer:
+                for chunk in timer.timed_chunks([b'ab', b'cde']):
+                    yield chunk
+        chunks = stream()
+        next(chunks)
+        chunks.close()
+        assert self.events[0].error is None
+        assert self.events[0].bytes == 2
+
+    def test_remove_hook_and_reset(self):
+        self.instrumentation.remove_hook(self.events.append)
+        with self.instrumentation.timer('csv', 'http://x/t.csv'):
+            pass
+        assert self.events == []
+        self.instrumentation.reset()
+        assert self.instrumentation.stats()['fetches'] == 0
+
+    def test_no_timer_ignores_everything(self):
+        NO_TIMER.source = 'cache'
+        assert NO_TIMER.source is None
+        assert NO_TIMER.downloaded(b'x') == b'x'
+
+    def test_response_retries(self):
+        response = MagicMock()
+        response.raw.retries.history = ('first', 'second')
+        assert response_retries(response) == 2
+        assert response_retries(object()) == 0
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from datetime import date, datetime, timedelta
+import random
+from unittest import TestCase
+
+import pytest
+
+from everypolitician.intervals import IntervalIndex, parse_date
+
+
+class TestParseDate(TestCase):
+
+    def test_full_date(self):
+        assert parse_date('2015-11-02') == date(2015, 11, 2)
+        assert parse_date('2015-11-02', end=True) == date(2015, 11, 2)
+
+    def test_partial_dates(self):
+        assert parse_date('2015') == date(2015, 1, 1)
+        assert parse_date('2015', end=True) == date(2015, 12, 31)
+        assert parse_date('2016-02') == date(2016, 2, 1)
+        assert parse_date('2016-02', end=True) == date(2016, 2, 29)
+
+    def test_dates_and_none(self):
+        assert parse_date(date(2015, 1, 2)) == date(2015, 1, 2)
+        assert parse_date(datetime(2015, 1, 2, 3, 4)) == date(2015, 1, 2)
+        assert parse_date(None) is None
+
+    def test_bad_date(self):
+        with pytest.raises(ValueError):
+            parse_date('2015-01-02-03')
+        with pytest.raises(ValueError):
+            parse_date('soon')
+
+
+class TestIntervalIndex(TestCase):
+
+    def test_overlapping(self):
+        index = IntervalIndex([
+            (date(2011, 1, 1), date(2015, 12, 31), 'b'),
+            (date(2007, 1, 1), date(2011, 12, 31), 'a'),
+            (date(2015, 11, 2), None, 'c'),
+            (None, date(2000, 1, 1), 'no start'),
+        ])
+        assert len(index) == 3
+        assert index.containing(date(2011, 6, 1)) == ['a', 'b']
+        assert index.containing(date(2015, 12, 1)) == ['b', 'c']
+        assert index.containing(date(2050, 1, 1)) == ['c']
+        assert index.containing(date(1999, 1, 1)) == []
+        assert index.overlapping(date(2000, 1, 1), date(2008, 1, 1)) == ['a']
+        assert index.last() == 'c'
+        assert IntervalIndex([]).last() is None
+
+    def test_same_as_brute_force(self):
+        rng = random.Random(42)
+        base = date(1900, 1, 1)
+        intervals = []
+        for i in range(300):
+            start = base + timedelta(days=rng.randint(0, 40000))
+            end = None if rng.random() < 0.05 else \
+                start + timedelta(days=rng.randint(0, 3000))
+            intervals.append((start, end, i))
+        index = IntervalIndex(intervals)
+        for _ in range(200):
+            q_start = base + timedelta(days=rng.randint(0, 45000))
+            q_end = q_start + timedelta(days=rng.randint(0, 1000))
+            expected = sorted(
+                (s, v) for s, e, v in intervals
+                if s <= q_end and (e is None or e >= q_start))
+            assert sorted(
+                (intervals[v][0], v)
+                for v in index.overlapping(q_start, q_end)) == expected
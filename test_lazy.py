@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+from os.path import dirname, join
+import threading
+import time
+from unittest import TestCase
+
+import pytest
+
+from everypolitician.lazy import (
+    LazyCountriesData, SlugIndex, SlugTable, scan_countries_json)
+
+
+EXAMPLE_FILENAME = join(dirname(__file__), 'test-data', 'example-countries.json')
+
+
+class TestScanCountriesJSON(TestCase):
+
+    def test_brackets_and_quotes_in_strings(self):
+        data = '''[
+          {"name": "A [b] {c}", "slug": "A\\\\\\"x", "legislatures": [
+            {"slug": "not-this-one"}]},
+          {"legislatures": [], "slug" : "B"},
+          {"name": "no slug"}
+        ]'''.encode('utf-8')
+        countries = scan_countries_json(data)
+        assert [slug for slug, _, _ in countries] == ['A\\"x', 'B', None]
+        for slug, start, end in countries:
+            assert json.loads(data[start:end].decode('utf-8')).get('slug') == slug
+
+    def test_unbalanced(self):
+        with pytest.raises(ValueError):
+            scan_countries_json(b'[{"slug": "A"}')
+
+
+class TestSlugTable(TestCase):
+
+    def test_lookups(self):
+        table = SlugTable(['Zambia', None, 'Åland', 'Argentina', 'Åland'])
+        assert list(table) == ['Zambia', None, 'Åland', 'Argentina', 'Åland']
+        assert table[-1] == 'Åland'
+        assert table.position('Åland') == 2
+        assert table.position('Zambia') == 0
+        with pytest.raises(KeyError):
+            table.position('Brazil')
+        with pytest.raises(KeyError):
+            table.position(None)
+        with pytest.raises(IndexError):
+            table[5]
+        index = SlugIndex(table)
+        assert 'Argentina' in index and 'Brazil' not in index
+        assert index.get('Brazil') is None
+        assert sorted(index) == ['Argentina', 'Zambia', 'Åland']
+        assert len(index) == 3
+
+
+class TestLazyCountriesData(TestCase):
+
+    def setUp(self):
+        with open(EXAMPLE_FILENAME, 'rb') as f:
+            self.raw = f.read()
+
+    def test_same_as_parsing_everything(self):
+        lazy = LazyCountriesData(self.raw)
+        assert list(lazy.slugs) == \
+            ['Aland', 'Argentina', 'British-Virgin-Islands']
+        assert list(lazy) == json.loads(self.raw.decode('utf-8'))
+        assert lazy[-1]['slug'] == 'British-Virgin-Islands'
+        assert [c['slug'] for c in lazy[1:]] == \
+            ['Argentina', 'British-Virgin-Islands']
+
+    def test_countries_only_parsed_when_used(self):
+        lazy = LazyCountriesData(self.raw)
+        assert lazy[lazy.slug_index['Argentina']]['name'] == 'Argentina'
+        assert [lazy.is_parsed(i) for i in range(3)] == [False, True, False]
+        assert lazy[1] is lazy[1]
+
+    def test_concurrent_access_parses_once(self):
+        class SlowLazyCountriesData(LazyCountriesData):
+            loads = 0
+
+            def _load(self, start, end):
+                self.loads += 1
+                time.sleep(0.01)
+                return super(SlowLazyCountriesData, self)._load(start, end)
+
+        lazy = SlowLazyCountriesData(self.raw)
+        threads = [
+            threading.Thread(target=lambda: lazy[0]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert lazy.loads == 1
+        assert [c['slug'] for c in lazy] == \
+            ['Aland', 'Argentina', 'British-Virgin-Islands']
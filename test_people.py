@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from everypolitician.people import normalize_name, people_shard
+
+
+class TestNormalizeName(TestCase):
+
+    def test_accents_case_and_whitespace(self):
+        assert normalize_name(' Adrián  PÉREZ ') == 'adrian perez'
+
+    def test_already_normal(self):
+        assert normalize_name('adrian perez') == 'adrian perez'
+
+
+class TestPeopleShard(TestCase):
+
+    def test_people_from_popolo_and_csv(self):
+        popolo = {'persons': [
+            {'id': 'a', 'name': 'Adrián Pérez',
+             'other_names': [{'name': 'A. Pérez'}],
+             'identifiers': [{'scheme': 'wikidata', 'identifier': 'Q1'}]},
+        ]}
+        shard = people_shard(popolo, [
+            ('term/1', [{'id': 'a', 'name': 'ADRIAN PEREZ'},
+                        {'id': 'b', 'name': 'Someone Else'}]),
+            ('term/2', [{'id': 'a', 'name': 'Adrián Pérez'}]),
+        ])
+        a, b = shard['people']
+        assert a == {
+            'id': 'a',
+            'name': 'Adrián Pérez',
+            'names': ['adrian perez', 'a. perez'],
+            'identifiers': [['wikidata', 'Q1']],
+            'periods': ['term/1', 'term/2'],
+        }
+        assert b['names'] == ['someone else']
+        assert b['periods'] == ['term/1']
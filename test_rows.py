@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from everypolitician.rows import (
+    columns_from_records, iter_lines, iter_records, row_class,
+    rows_from_records, select_records)
+
+
+class TestRows(TestCase):
+
+    def test_lines_split_between_chunks(self):
+        chunks = [b'id,name\r\n1,"Ana\nMar', b'\xc3', b'\xada"\r\n2,Bob\r\n']
+        rows = list(rows_from_records(iter_records(iter_lines(chunks))))
+        assert rows == [
+            {'id': '1', 'name': 'Ana\nMaría'}, {'id': '2', 'name': 'Bob'}]
+
+    def test_short_and_long_rows_like_dict_reader(self):
+        records = [['a', 'b'], ['1'], ['1', '2', '3']]
+        assert list(rows_from_records(records)) == [
+            {'a': '1', 'b': None}, {'a': '1', 'b': '2', None: ['3']}]
+
+    def test_row_class_shared_and_renames_bad_names(self):
+        cls = row_class(['id', 'group', 'class', 'x-y'])
+        assert cls is row_class(('id', 'group', 'class', 'x-y'))
+        assert cls._fields == ('id', 'group', '_2', '_3')
+
+    def test_tuple_rows(self):
+        records = [['a', 'b'], ['1', '2'], ['3']]
+        rows = list(rows_from_records(records, 'tuple'))
+        assert rows[0].a == '1'
+        assert rows[1] == ('3', None)
+
+    def test_columns(self):
+        records = [['a', 'b'], ['x', '1'], ['x', '2']]
+        columns = columns_from_records(iter(records))
+        assert list(columns.items()) == [('a', ['x', 'x']), ('b', ['1', '2'])]
+
+    def test_empty(self):
+        assert list(rows_from_records([])) == []
+        assert columns_from_records([]) == {}
+
+
+class TestSelectRecords(TestCase):
+
+    records = [['id', 'name', 'group'], ['1', 'Ana', 'A'], ['2', 'Bob', 'B'],
+               ['3', 'Cy']]
+
+    def test_columns_in_order_given(self):
+        assert list(select_records(self.records, columns=['group', 'id'])) == \
+            [['group', 'id'], ['A', '1'], ['B', '2'], [None, '3']]
+
+    def test_where_dict(self):
+        assert list(select_records(self.records, where={'group': 'B'})) == \
+            [['id', 'name', 'group'], ['2', 'Bob', 'B']]
+        assert list(select_records(
+            self.records, columns=['id'], where={'group': {'A', None}})) == \
+            [['id'], ['1'], ['3']]
+
+    def test_where_function(self):
+        seen = []
+
+        def where(row):
+            seen.append(dict(row))
+            return row['name'].startswith('B')
+
+        assert list(select_records(self.records, where=where)) == \
+            [['id', 'name', 'group'], ['2', 'Bob', 'B']]
+        assert seen[2] == {'id': '3', 'name': 'Cy', 'group': None}
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            list(select_records(self.records, columns=['party']))
+        with self.assertRaises(ValueError):
+            list(select_records(self.records, where={'party': 'A'}))
+
+    def test_no_records(self):
+        assert list(select_records([], columns=['id'])) == []
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from unittest import TestCase
+
+import pytest
+
+from everypolitician.tables import Categorical, MembershipsTable
+
+
+Slugged = namedtuple('Slugged', ['slug'])
+Period = namedtuple('Period', ['slug', 'country', 'legislature'])
+
+
+def period(country, legislature, slug):
+    return Period(slug, Slugged(country), Slugged(legislature))
+
+
+class TestCategorical(TestCase):
+
+    def test_codes_and_categories(self):
+        column = Categorical(1)
+        for value in ['a', 'b', 'a', None]:
+            column.append(value)
+        assert list(column.codes) == [-1, 0, 1, 0, -1]
+        assert column.categories == ['a', 'b']
+        assert column.values() == [None, 'a', 'b', 'a', None]
+        assert column[2] == 'b'
+        assert len(column) == 5
+
+
+class TestMembershipsTable(TestCase):
+
+    def setUp(self):
+        self.table = MembershipsTable()
+        self.table.add(period('UK', 'Commons', '57'), [
+            ['id', 'group'], ['1', 'Labour'], ['2', 'Labour'], ['3']])
+        self.table.add(period('UK', 'Lords', '1'), [
+            ['id', 'area'], ['4', 'Kent']])
+
+    def test_rows_tagged_and_columns_aligned(self):
+        table = self.table
+        assert len(table) == 4
+        assert list(table.columns) == [
+            'country_slug', 'legislature_slug', 'legislative_period_slug',
+            'id', 'group', 'area']
+        assert table['legislature_slug'].values() == \
+            ['Commons', 'Commons', 'Commons', 'Lords']
+        assert table['country_slug'].categories == ['UK']
+        assert table['group'].values() == ['Labour', 'Labour', None, None]
+        assert table['area'].values() == [None, None, None, 'Kent']
+
+    def test_empty_period(self):
+        self.table.add(period('UK', 'Lords', '2'), [])
+        assert len(self.table) == 4
+
+    def test_to_numpy(self):
+        numpy = pytest.importorskip('numpy')
+        codes, categories = self.table.to_numpy()['group']
+        assert codes.tolist() == [0, 0, -1, -1]
+        assert categories.tolist() == ['Labour']
+        assert numpy.bincount(codes[codes >= 0]).tolist() == [2]
+
+    def test_to_arrow(self):
+        pytest.importorskip('pyarrow')
+        arrow_table = self.table.to_arrow()
+        assert arrow_table.num_rows == 4
+        assert arrow_table.column('area').to_pylist() == \
+            [None, None, None, 'Kent']
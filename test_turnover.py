@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from everypolitician.turnover import (
+    consecutive_diffs, diff_members, period_members)
+
+
+OLD = [
+    ['id', 'name', 'group', 'area'],
+    ['a', 'Ana', 'Red', 'North'],
+    ['b', 'Bob', 'Red', 'South'],
+    ['b', 'Bob', 'Blue', 'South'],
+    ['c', 'Cy', 'Green', 'East'],
+]
+
+NEW = [
+    ['id', 'group', 'area'],
+    ['b', 'Blue', 'West'],
+    ['a', 'Blue', 'North'],
+    ['a', 'Red', 'North'],
+    ['d', 'Red', 'East'],
+]
+
+
+class TestTurnover(TestCase):
+
+    def test_period_members(self):
+        members = period_members(OLD)
+        assert list(members) == ['a', 'b', 'c']
+        assert members['b'] == ['Red', 'South', 'Blue', 'South']
+
+    def test_missing_columns(self):
+        members = period_members([['id', 'name'], ['a', 'Ana', 'extra']])
+        assert members['a'] == [None, None, None, None]
+        with self.assertRaises(ValueError):
+            period_members([['name'], ['Ana']])
+        assert period_members([]) == {}
+
+    def test_diff_members(self):
+        diff = diff_members(
+            'old', 'new', period_members(OLD), period_members(NEW))
+        assert diff.old == 'old' and diff.new == 'new'
+        assert diff.joined == ['d']
+        assert diff.left == ['c']
+        # Bob ended the old period in Blue, so hasn't changed group:
+        assert diff.group_changes == [('a', 'Red', 'Blue')]
+        assert diff.area_changes == [('b', 'South', 'West')]
+
+    def test_consecutive_diffs(self):
+        members = [period_members(r) for r in (OLD, NEW, OLD)]
+        diffs = consecutive_diffs([1, 2, 3], iter(members))
+        assert [(d.old, d.new) for d in diffs] == [(1, 2), (2, 3)]
+        assert diffs[1].joined == ['c']
+        assert consecutive_diffs([1], members[:1]) == []